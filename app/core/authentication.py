@@ -0,0 +1,92 @@
+import copy
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication, \
+    get_authorization_header
+
+from .cache import LRUCache
+
+CACHE_SETTINGS = {
+    'TIMEOUT': 60,
+    'LOCAL_TIMEOUT': 5,
+    'MAX_SIZE': 10000,
+    'DJANGO_CACHE': None,
+    **getattr(settings, 'TOKEN_AUTH_CACHE', {}),
+}
+
+# with a shared cache, other processes only invalidate that one, so entries
+# are kept locally for LOCAL_TIMEOUT seconds at most
+token_cache = LRUCache(max_size=CACHE_SETTINGS['MAX_SIZE'],
+                       timeout=CACHE_SETTINGS['LOCAL_TIMEOUT']
+                       if CACHE_SETTINGS['DJANGO_CACHE']
+                       else CACHE_SETTINGS['TIMEOUT'])
+
+
+def cache_key(key):
+    """Return the shared cache key for a token key"""
+    return f'auth-token:{key}'
+
+
+def invalidate_token(key):
+    """Drop a token from the local and shared caches"""
+    token_cache.delete(key)
+    if CACHE_SETTINGS['DJANGO_CACHE']:
+        caches[CACHE_SETTINGS['DJANGO_CACHE']].delete(cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication caching the token and its user
+
+    Lookups hit an in-process LRU first, then the Django cache named by
+    `TOKEN_AUTH_CACHE['DJANGO_CACHE']` if set, then the database. Entries
+    are invalidated by signals once a token deletion or user change commits;
+    other processes see it within `LOCAL_TIMEOUT`, and changes that skip
+    signals are picked up once `TIMEOUT` expires.
+    """
+
+    async def aauthenticate(self, request):
+        """Authenticate from an async view, in a thread on cache misses"""
+        key = self.get_key(request)
+        # reuse the entry found, it may expire before a second lookup
+        cached = token_cache.get(key) if key is not None else None
+        if cached is not None:
+            return self.copy_credentials(cached)
+        return await sync_to_async(self.authenticate)(request)
+
+    def get_key(self, request):
+        """Return the token key of a well formed header, else None"""
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            return None
+
+    def authenticate_credentials(self, key):
+        """Return (user, token) from cache, falling back to the database"""
+        cached = token_cache.get(key)
+
+        shared = None
+        if cached is None and CACHE_SETTINGS['DJANGO_CACHE']:
+            shared = caches[CACHE_SETTINGS['DJANGO_CACHE']]
+            cached = shared.get(cache_key(key))
+            if cached is not None:
+                token_cache.set(key, cached)
+
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+            if shared is not None:
+                shared.set(cache_key(key), cached, CACHE_SETTINGS['TIMEOUT'])
+
+        return self.copy_credentials(cached)
+
+    def copy_credentials(self, cached):
+        """Return copies of cached (user, token), as requests mutate them"""
+        user, token = map(copy.copy, cached)
+        token.user = user
+        return (user, token)
@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_TIMEOUT = object()
+
+
+class LRUCache:
+    """Thread safe in-process LRU cache with a per entry timeout"""
+
+    def __init__(self, max_size=1024, timeout=60):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if missing or expired"""
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """Store value for key, evicting the least recently used entries"""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Remove key if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+RESPONSE_CACHE_SETTINGS = {
+    'CACHE': 'default',
+    'TIMEOUT': 300,
+    **getattr(settings, 'RESPONSE_CACHE', {}),
+}
+
+response_caches = {}
+
+
+class VersionedCache:
+    """Namespaced Django cache invalidated by bumping a version
+
+    Entries are stored under the current version, so `bump()` invalidates
+    the whole namespace in O(1) on any cache backend; stale entries simply
+    expire. Hits and misses are counted in the same cache so that every
+    process sharing it reports the same totals.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        response_caches[namespace] = self
+
+    @property
+    def cache(self):
+        return caches[RESPONSE_CACHE_SETTINGS['CACHE']]
+
+    def make_key(self, *parts):
+        """Return a cache key in this namespace"""
+        return ':'.join(('response-cache', self.namespace) + parts)
+
+    def version(self):
+        """Return the current version, creating it if missing"""
+        key = self.make_key('version')
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, uuid.uuid4().hex, None)
+            version = self.cache.get(key)
+        return version
+
+    def bump(self):
+        """Invalidate every entry in the namespace"""
+        self.cache.set(self.make_key('version'), uuid.uuid4().hex, None)
+
+    def get(self, key, version=None):
+        """Return the entry for key in a version, counting hit or miss"""
+        version = version or self.version()
+        value = self.cache.get(self.make_key(version, key))
+        self.incr('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value, version=None):
+        """Store the entry for key in a version
+
+        Pass the version read before computing the value, so a value
+        computed while the namespace was bumped is never stored as current.
+        """
+        version = version or self.version()
+        self.cache.set(self.make_key(version, key), value,
+                       RESPONSE_CACHE_SETTINGS['TIMEOUT'])
+
+    def incr(self, counter):
+        """Increment a counter"""
+        key = self.make_key(counter)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, None):
+                self.cache.incr(key)
+
+    def stats(self):
+        """Return the hit and miss counters"""
+        return {counter: self.cache.get(self.make_key(counter), 0)
+                for counter in ('hits', 'misses')}
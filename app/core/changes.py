@@ -0,0 +1,183 @@
+import base64
+import binascii
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .authentication import CachedTokenAuthentication
+from .models import Tombstone
+
+CHANGE_FEED_SETTINGS = {
+    'LAG': 60,
+    'RETENTION_DAYS': 30,
+    **getattr(settings, 'CHANGE_FEED', {}),
+}
+
+UPSERT, DELETE = 0, 1
+
+
+class CursorExpired(APIException):
+    """The deletions since a cursor are no longer retained"""
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Cursor expired, sync again without one.'
+    default_code = 'cursor_expired'
+
+
+def encode_cursor(position):
+    """Return the opaque cursor of a (time, upsert id, tombstone id)"""
+    changed_at, upsert_id, tombstone_id = position
+    value = f'{changed_at.isoformat()} {upsert_id} {tombstone_id}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the position of a cursor, raising ValueError if invalid"""
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        changed_at, upsert_id, tombstone_id = value.split(' ')
+        changed_at = datetime.datetime.fromisoformat(changed_at)
+        upsert_id, tombstone_id = int(upsert_id), int(tombstone_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if timezone.is_naive(changed_at):
+        raise ValueError('Invalid cursor')
+    return changed_at, upsert_id, tombstone_id
+
+
+class ChangeFeedAPIView(GenericAPIView):
+    """Base API view listing objects changed and deleted since a cursor
+
+    Upserts are read by `(updated_at, id)` and deletions from tombstones by
+    `(deleted_at, id)`, merged in time order. The cursor holds the position
+    of the last change returned, so each page resumes where the previous
+    stopped and costs one index range scan per table.
+
+    The last page moves the cursor up to the time listed until, even
+    without changes, so polling clients never fall behind the retention.
+
+    `updated_at` and `deleted_at` are stamped before their transaction
+    commits, so a change is only listed once it is `CHANGE_FEED['LAG']`
+    seconds old. LAG must exceed the longest write transaction, e.g. a bulk
+    request or an import batch: a change committed later than LAG after its
+    stamp falls behind a cursor already returned and is never listed.
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    pagination_class = None
+    cursor_query_param = 'since'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get(self, request):
+        """Return a page of upserts and deletes after the cursor"""
+        position = self.get_position(request)
+        page_size = self.get_page_size(request)
+        until = timezone.now() - datetime.timedelta(
+            seconds=CHANGE_FEED_SETTINGS['LAG'])
+
+        changes = sorted(
+            self.get_upserts(position, until, page_size + 1)
+            + self.get_deletes(position, until, page_size + 1),
+            key=lambda change: change[:3]
+        )
+        has_more = len(changes) > page_size
+        changes = changes[:page_size]
+
+        # the cursor keeps the last upsert and tombstone ids at its time
+        position = list(position) if position else None
+        for changed_at, kind, change_id, _ in changes:
+            if position is None or changed_at != position[0]:
+                position = [changed_at, 0, 0]
+            position[1 + kind] = change_id
+        if not has_more and (position is None or position[0] < until):
+            # everything until then was listed, so a quiet feed's cursor
+            # keeps up with the retention of tombstones
+            position = [until, 0, 0]
+
+        cursor = encode_cursor(position) if position else None
+        return Response({
+            'cursor': cursor,
+            'next': replace_query_param(request.build_absolute_uri(),
+                                        self.cursor_query_param, cursor)
+            if has_more else None,
+            'upserts': [data for _, kind, _, data in changes
+                        if kind == UPSERT],
+            'deletes': [data for _, kind, _, data in changes
+                        if kind == DELETE],
+        })
+
+    def get_position(self, request):
+        """Return the position of the cursor, or None to start over"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            raise ValidationError({self.cursor_query_param:
+                                   ['Invalid cursor.']})
+
+        retained = timezone.now() - datetime.timedelta(
+            days=CHANGE_FEED_SETTINGS['RETENTION_DAYS'])
+        if position[0] < retained:
+            raise CursorExpired()
+        return position
+
+    def get_page_size(self, request):
+        """Return the requested page size, capped to `max_page_size`"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_upserts(self, position, until, limit):
+        """Return (updated_at, UPSERT, id, data) of changed objects"""
+        queryset = self.get_queryset().filter(updated_at__lte=until)
+        if position is not None:
+            changed_at, upsert_id, _ = position
+            queryset = queryset.filter(
+                Q(updated_at__gt=changed_at)
+                | Q(updated_at=changed_at, pk__gt=upsert_id)
+            )
+        queryset = queryset.order_by('updated_at', 'pk')
+
+        values = self.get_serializer().get_values_representation()
+        if values is None:
+            return [(instance.updated_at, UPSERT, instance.pk,
+                     self.get_serializer(instance).data)
+                    for instance in queryset[:limit]]
+
+        lookups, represent = values
+        queryset = queryset.values(*dict.fromkeys([*lookups, 'pk',
+                                                   'updated_at']))
+        return [(row['updated_at'], UPSERT, row['pk'], represent(row))
+                for row in queryset[:limit]]
+
+    def get_deletes(self, position, until, limit):
+        """Return (deleted_at, DELETE, tombstone id, object id) of deletes"""
+        queryset = Tombstone.objects.filter(
+            model=self.get_queryset().model._meta.label_lower,
+            deleted_at__lte=until
+        )
+        if position is not None:
+            changed_at, _, tombstone_id = position
+            queryset = queryset.filter(
+                Q(deleted_at__gt=changed_at)
+                | Q(deleted_at=changed_at, pk__gt=tombstone_id)
+            )
+        return [(deleted_at, DELETE, pk, object_id)
+                for pk, deleted_at, object_id in queryset
+                .order_by('deleted_at', 'pk')
+                .values_list('pk', 'deleted_at', 'object_id')[:limit]]
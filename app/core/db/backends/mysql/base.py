@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+
+from core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """MySQL backend with an optional connection pool"""
@@ -0,0 +1,41 @@
+import contextlib
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from core.metrics import current_request
+
+
+def run_isolated(func, *args, **kwargs):
+    """Call func on this thread's own connections, closed afterwards
+
+    Queries are counted in the metrics of the current request, if any.
+    """
+    metrics = current_request.get()
+    try:
+        with contextlib.ExitStack() as stack:
+            if metrics is not None:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+            return func(*args, **kwargs)
+    finally:
+        # worker threads are shared, so never keep a connection in one;
+        # pooled connections go back to the pool
+        connections.close_all()
+
+
+async def run_query(func, *args, **kwargs):
+    """Await a function doing blocking queries
+
+    With `ASYNC_QUERY_FANOUT` the function runs in a worker thread on a
+    connection of its own, so queries of one request awaited together run
+    concurrently. Otherwise it runs in the request's thread like the async
+    ORM, one query at a time and inside the request's transaction.
+    """
+    if not getattr(settings, 'ASYNC_QUERY_FANOUT', False):
+        return await sync_to_async(func)(*args, **kwargs)
+
+    return await sync_to_async(functools.partial(run_isolated, func),
+                               thread_sensitive=False)(*args, **kwargs)
@@ -0,0 +1,222 @@
+import collections
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """No connection could be acquired from the pool in time"""
+
+
+class ConnectionPool:
+    """Thread safe pool of DB-API connections
+
+    At most `max_size` connections are open at once; `acquire()` waits up
+    to `timeout` seconds for one to be released. Idle connections are
+    reused most recently released first and checked with `check` when idle
+    for more than `check_after` seconds. Connections older than
+    `max_lifetime` seconds are closed instead of being reused.
+    """
+
+    def __init__(self, connect, max_size=10, timeout=30, check=None,
+                 check_after=30, max_lifetime=3600):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+        self._idle = collections.deque()
+        self._created = {}
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Return an idle or new connection, waiting for one if needed"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f'No connection available within '
+                            f'{self.timeout} seconds'
+                        )
+                    self._condition.wait(remaining)
+
+                if not self._idle:
+                    self._size += 1
+                    break
+                connection, released = self._idle.pop()
+
+            if self.is_usable(connection, released):
+                return connection
+            self.discard(connection)
+
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._created[id(connection)] = time.monotonic()
+        return connection
+
+    def release(self, connection):
+        """Return a connection to the pool"""
+        if self.is_expired(connection):
+            self.discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        """Close a connection taken from the pool"""
+        with self._condition:
+            self._created.pop(id(connection), None)
+            self._size -= 1
+            self._condition.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close every idle connection"""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def is_expired(self, connection):
+        """Return whether a connection is past its lifetime"""
+        created = self._created.get(id(connection), 0)
+        return (self.max_lifetime is not None
+                and time.monotonic() - created > self.max_lifetime)
+
+    def is_usable(self, connection, released):
+        """Return whether an idle connection can be reused"""
+        if self.is_expired(connection):
+            return False
+        if (self.check is None
+                or time.monotonic() - released <= self.check_after):
+            return True
+        try:
+            self.check(connection)
+        except Exception:
+            return False
+        return True
+
+    @property
+    def size(self):
+        """Return the number of open connections, idle or in use"""
+        return self._size
+
+    @property
+    def in_use(self):
+        """Return the number of connections acquired and not released"""
+        with self._condition:
+            return self._size - len(self._idle)
+
+
+def check_connection(connection):
+    """Raise an error unless the connection answers a query"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+class PooledDatabaseWrapperMixin:
+    """DatabaseWrapper mixin taking connections from a ConnectionPool
+
+    Enabled with `OPTIONS['pool']`, True or a dict of ConnectionPool
+    arguments, like the PostgreSQL backend. Pools are per process, alias
+    and database name (which changes for tests); closing the Django
+    connection returns it to the pool.
+    """
+    _connection_pools = {}
+
+    @property
+    def pool(self):
+        """Return the pool of this alias, or None if pooling is disabled"""
+        pool_options = self.settings_dict['OPTIONS'].get('pool')
+        if self.alias == NO_DB_ALIAS or not pool_options:
+            return None
+
+        key = self.pool_key
+        if key not in self._connection_pools:
+            if self.settings_dict.get('CONN_MAX_AGE', 0) != 0:
+                raise ImproperlyConfigured(
+                    "Pooling doesn't support persistent connections."
+                )
+            if pool_options is True:
+                pool_options = {}
+            if self.settings_dict['CONN_HEALTH_CHECKS']:
+                pool_options = {'check': check_connection, **pool_options}
+
+            params = self.get_connection_params()
+            pool = ConnectionPool(
+                lambda: super(PooledDatabaseWrapperMixin,
+                              self).get_new_connection(params),
+                **pool_options
+            )
+            # Threads racing to create the pool keep the first one
+            self._connection_pools.setdefault(key, pool)
+
+        return self._connection_pools[key]
+
+    def close_pool(self):
+        """Close the idle connections and forget the pool"""
+        if self.pool:
+            self.pool.close()
+            del self._connection_pools[self.pool_key]
+
+    @property
+    def pool_key(self):
+        """Return the key of the pool, new after a fork"""
+        return self.alias, os.getpid(), self.settings_dict['NAME']
+
+    def get_connection_params(self):
+        """Return the driver parameters, without the pool options"""
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        """Return a connection from the pool"""
+        if self.pool:
+            return self.pool.acquire()
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        """Return the connection to the pool, unless it is unusable"""
+        if self.connection is None or not self.pool:
+            return super()._close()
+
+        connection = self.connection
+        try:
+            if self.in_atomic_block:
+                raise OperationalError('Closed in a transaction')
+            if not self.get_autocommit():
+                connection.rollback()
+        except Exception:
+            self.pool.discard(connection)
+        else:
+            self.pool.release(connection)
+
+    def close_if_health_check_failed(self):
+        """Skip the per request check, the pool checks idle connections"""
+        if self.pool:
+            return
+        return super().close_if_health_check_failed()
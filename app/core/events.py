@@ -0,0 +1,307 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+EVENTS_SETTINGS = {
+    'BACKEND': 'core.events.LocalBackend',
+    'QUEUE_SIZE': 100,
+    'HEARTBEAT': 15,
+    'DJANGO_CACHE': 'default',
+    'POLL_INTERVAL': 0.5,
+    'RETENTION': 60,
+    **getattr(settings, 'EVENTS', {}),
+}
+
+# queued in place of the events a subscriber was too slow to receive
+OVERFLOW = object()
+
+
+class Subscription:
+    """Bounded queue of the events published to some channels
+
+    Events are queued on the event loop the subscription was created on.
+    A subscriber falling `QUEUE_SIZE` events behind loses its queued events
+    and gets `OVERFLOW` instead, so a slow client never holds memory.
+    """
+
+    def __init__(self, backend, channels, max_size):
+        self.backend = backend
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_size)
+        self.overflowed = False
+
+    def push(self, event):
+        """Queue an event, from the subscription's event loop"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflow()
+
+    def overflow(self):
+        """Drop the queued events for OVERFLOW"""
+        if self.overflowed:
+            return
+        self.overflowed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(OVERFLOW)
+
+    async def get(self):
+        """Return the next event, or OVERFLOW"""
+        return await self.queue.get()
+
+    def close(self):
+        """Stop receiving events"""
+        self.backend.unsubscribe(self)
+
+
+class BaseBackend:
+    """Interface of event broker backends
+
+    `publish()` may be called from any thread, `subscribe()` from a
+    coroutine. A backend shared by several processes delivers events
+    published in any of them.
+    """
+
+    def publish(self, channel, event):
+        """Send an event to the subscribers of channel"""
+        raise NotImplementedError
+
+    def subscribe(self, channels):
+        """Return a Subscription to channels"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        """Stop delivering events to subscription"""
+        raise NotImplementedError
+
+
+class LocalBackend(BaseBackend):
+    """Backend delivering events to subscribers of this process only
+
+    Unfit for several workers, where each subscriber would silently miss
+    the events of the other workers; use CacheBackend there.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push,
+                                                       event)
+            except RuntimeError:
+                # the loop was closed without closing the subscription
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels,
+                                    EVENTS_SETTINGS['QUEUE_SIZE'])
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()) \
+                    .add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel, set())
+                subscribers.discard(subscription)
+                if not subscribers:
+                    self._subscriptions.pop(channel, None)
+
+    def subscriber_count(self):
+        """Return the number of open subscriptions"""
+        with self._lock:
+            return len(set().union(*self._subscriptions.values()))
+
+
+class CacheBackend(LocalBackend):
+    """Backend relaying events through the shared `EVENTS['DJANGO_CACHE']`
+
+    Events are stored in the shared cache under an incremented sequence
+    number. While a process has subscribers, it polls the sequence every
+    `POLL_INTERVAL` seconds and delivers the new events to them, so each
+    subscriber overflows on its own when falling behind. Events expire
+    after `RETENTION` seconds; when a process misses some, all its
+    subscribers get `OVERFLOW`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pollers = {}
+
+    @property
+    def cache(self):
+        return caches[EVENTS_SETTINGS['DJANGO_CACHE']]
+
+    def make_key(self, *parts):
+        """Return a cache key of the event log"""
+        return ':'.join(('events',) + tuple(map(str, parts)))
+
+    def publish(self, channel, event):
+        key = self.make_key('sequence')
+        try:
+            sequence = self.cache.incr(key)
+        except ValueError:
+            sequence = 1 if self.cache.add(key, 1, None) \
+                else self.cache.incr(key)
+        # pollers may see the sequence before the event, see poll()
+        self.cache.set(self.make_key(sequence), (channel, event),
+                       EVENTS_SETTINGS['RETENTION'])
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        loop = subscription.loop
+        if self._pollers.get(loop) is None:
+            # read once per process and loop, so events published right
+            # after subscribing are delivered
+            self._pollers[loop] = loop.create_task(
+                self.poll(loop, self.sequence()))
+        return subscription
+
+    def sequence(self):
+        """Return the number of the last published event"""
+        return self.cache.get(self.make_key('sequence'), 0)
+
+    def read(self, after):
+        """Return the last sequence number and the events after a number
+
+        At most `QUEUE_SIZE` events are returned, as (sequence number,
+        event) pairs. Events are (channel, event) pairs, or None when not
+        stored, yet or anymore.
+        """
+        last = self.sequence()
+        numbers = range(after + 1,
+                        min(last, after + EVENTS_SETTINGS['QUEUE_SIZE']) + 1)
+        stored = self.cache.get_many([self.make_key(number)
+                                      for number in numbers])
+        return last, [(number, stored.get(self.make_key(number)))
+                      for number in numbers]
+
+    async def poll(self, loop, last):
+        """Deliver the events after last to the subscribers of loop
+
+        Publishers increment the sequence before storing the event, so a
+        missing event is pending until it could have expired: events after
+        last were published after `since`.
+        """
+        read = sync_to_async(self.read, thread_sensitive=False)
+        since = time.monotonic()
+        try:
+            while self.local_subscriptions(loop):
+                await asyncio.sleep(EVENTS_SETTINGS['POLL_INTERVAL'])
+                while True:
+                    started = time.monotonic()
+                    sequence, events = await read(last)
+                    end = events[-1][0] if events else last
+                    last = self.deliver_all(loop, last, events, sequence,
+                                            started - since)
+                    if last == sequence:
+                        since = started
+                    # read the next events unless caught up or pending
+                    if last == sequence or last != end:
+                        break
+        finally:
+            self._pollers.pop(loop, None)
+
+    def deliver_all(self, loop, last, events, sequence, age):
+        """Deliver read events to the subscribers of loop, return the last
+
+        Missing events stop the delivery, unless older than `RETENTION`
+        seconds (age is how long ago the ones after last were published at
+        most): they then expired, and the subscribers get OVERFLOW.
+        """
+        for number, event in events:
+            if event is not None:
+                self.deliver(loop, *event)
+            elif age < EVENTS_SETTINGS['RETENTION']:
+                break
+            else:
+                for subscription in self.local_subscriptions(loop):
+                    subscription.overflow()
+                return sequence
+            last = number
+        return last
+
+    def local_subscriptions(self, loop):
+        """Return the open subscriptions of loop"""
+        with self._lock:
+            return {subscription
+                    for subscriptions in self._subscriptions.values()
+                    for subscription in subscriptions
+                    if subscription.loop is loop}
+
+    def deliver(self, loop, channel, event):
+        """Queue an event for the subscribers of loop to channel"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            if subscription.loop is loop:
+                subscription.push(event)
+
+
+class EventStream:
+    """Async iterator of the encoded events of a subscription
+
+    A `: heartbeat` comment is sent after `HEARTBEAT` idle seconds. On
+    overflow an `overflow` event ends the stream. `close()` unsubscribes,
+    and is called by Django when the response is closed.
+    """
+
+    def __init__(self, subscription, renderer):
+        self.subscription = subscription
+        self.renderer = renderer
+        self.started = self.finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.finished:
+            raise StopAsyncIteration
+        if not self.started:
+            self.started = True
+            return b': connected\n\n'
+
+        try:
+            event = await asyncio.wait_for(self.subscription.get(),
+                                           EVENTS_SETTINGS['HEARTBEAT'])
+        except asyncio.TimeoutError:
+            return b': heartbeat\n\n'
+
+        if event is OVERFLOW:
+            self.finished = True
+            self.close()
+            return self.renderer.render_event('overflow', {
+                'detail': 'Too many events, resync from the change feeds.'
+            })
+        return self.renderer.render_event(event['event'], event['data'])
+
+    def close(self):
+        """Stop receiving events"""
+        self.subscription.close()
+
+
+broker = SimpleLazyObject(lambda: import_string(EVENTS_SETTINGS['BACKEND'])())
+
+
+def publish_change(channel, name, ids):
+    """Publish a change of objects once the current transaction commits"""
+    event = {'event': name, 'data': {'ids': list(ids)}}
+    transaction.on_commit(lambda: broker.publish(channel, event))
@@ -0,0 +1,183 @@
+import contextlib
+import itertools
+import math
+import secrets
+import time
+import tracemalloc
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import CACHE_SETTINGS, invalidate_token
+from core.cache import RESPONSE_CACHE_SETTINGS
+from core.metrics import METRICS_SETTINGS
+from core.throttling import TokenBucketThrottle
+from departments.models import Department
+from employees.models import Employee
+
+SCENARIOS = (
+    'employees-list', 'employees-detail', 'employees-create',
+    'employees-update', 'departments-list', 'departments-detail',
+    'departments-create', 'departments-update',
+)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of sorted values"""
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API through the test client"""
+    help = ('Measure latency, queries and memory of the API endpoints. '
+            'Run against seed_bench data; all writes are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--profile-requests', type=int, default=20,
+            help='Requests counted for queries and memory, which are '
+                 'measured apart as tracing slows requests down'
+        )
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS, dest='scenarios')
+
+    def handle(self, *args, **options):
+        with self.isolated(), transaction.atomic():
+            results = self.run(options)
+            transaction.set_rollback(True)
+        invalidate_token(self.token.key)
+
+        self.stdout.write(f'{"scenario":<20} {"p50 ms":>9} {"p99 ms":>9} '
+                          f'{"queries":>8} {"peak KiB":>9}')
+        for name, result in results:
+            self.stdout.write(
+                f'{name:<20} {result["p50"]:>9.2f} {result["p99"]:>9.2f} '
+                f'{result["queries"]:>8.1f} {result["peak"]:>9.1f}'
+            )
+
+    @contextlib.contextmanager
+    def isolated(self):
+        """Keep cache entries in a private cache and skip throttling
+
+        Cached responses and tokens would otherwise outlive the rolled back
+        rows. The cache settings are read at import, so they are patched.
+        """
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        caches = {**settings.CACHES, 'bench': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'bench-{secrets.token_hex(8)}',
+        }}
+        with override_settings(ALLOWED_HOSTS=hosts, CACHES=caches), \
+                mock.patch.dict(RESPONSE_CACHE_SETTINGS, CACHE='bench'), \
+                mock.patch.dict(CACHE_SETTINGS, DJANGO_CACHE='bench'), \
+                mock.patch.dict(METRICS_SETTINGS, DJANGO_CACHE='bench'), \
+                mock.patch.dict(TokenBucketThrottle.THROTTLE_RATES,
+                                clear=True):
+            # views bind their throttle classes at import, but scopes
+            # without a rate aren't throttled
+            yield
+
+    def run(self, options):
+        """Return (scenario, result) pairs for the selected scenarios"""
+        employee_ids = list(Employee.objects.order_by('id')
+                            .values_list('id', flat=True)[:1000])
+        department_ids = list(Department.objects.order_by('id')
+                              .values_list('id', flat=True)[:1000])
+        if not employee_ids or not department_ids:
+            raise CommandError('No data to benchmark, run seed_bench first')
+
+        user = get_user_model().objects.create_superuser(
+            f'bench-{secrets.token_hex(8)}', password=None
+        )
+        self.token = Token.objects.create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        scenarios = self.scenarios(client, employee_ids, department_ids)
+
+        return [(name, self.measure(scenarios[name], options))
+                for name in options['scenarios'] or SCENARIOS]
+
+    def scenarios(self, client, employee_ids, department_ids):
+        """Return request functions taking a unique request number"""
+        employees_url = reverse('employees:employee-list')
+        departments_url = reverse('departments:department-list')
+
+        def employee_url(i):
+            pk = employee_ids[i % len(employee_ids)]
+            return reverse('employees:employee-details', args=[pk])
+
+        def department_url(i):
+            pk = department_ids[i % len(department_ids)]
+            return reverse('departments:department-details', args=[pk])
+
+        return {
+            'employees-list': lambda i: client.get(employees_url),
+            'employees-detail': lambda i: client.get(employee_url(i)),
+            'employees-create': lambda i: client.post(employees_url, {
+                'first_name': 'Bench', 'last_name': 'Create',
+                'email': f'bench-create-{i}@bench.example.com',
+                'salary': '5000.00',
+                'department': department_ids[i % len(department_ids)],
+            }, content_type='application/json'),
+            'employees-update': lambda i: client.patch(
+                employee_url(i), {'salary': f'{4000 + i % 1000}.00'},
+                content_type='application/json'
+            ),
+            'departments-list': lambda i: client.get(departments_url),
+            'departments-detail': lambda i: client.get(department_url(i)),
+            'departments-create': lambda i: client.post(departments_url, {
+                'name': f'Bench create {i}', 'description': 'Benchmark',
+            }, content_type='application/json'),
+            'departments-update': lambda i: client.patch(
+                department_url(i), {'description': f'Benchmark {i}'},
+                content_type='application/json'
+            ),
+        }
+
+    def measure(self, request, options):
+        """Time the requests, then count queries and peak memory"""
+        counter = itertools.count()
+
+        def send():
+            response = request(next(counter))
+            if response.status_code >= 400:
+                raise CommandError(f'{response.status_code}: '
+                                   f'{response.content[:200]!r}')
+            return response
+
+        for _ in range(options['warmup']):
+            send()
+
+        latencies = []
+        for _ in range(options['requests']):
+            started = time.perf_counter()
+            send()
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+
+        profiled = max(options['profile_requests'], 1)
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            try:
+                for _ in range(profiled):
+                    send()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        return {
+            'p50': percentile(latencies, 50) if latencies else 0,
+            'p99': percentile(latencies, 99) if latencies else 0,
+            'queries': len(queries) / profiled,
+            'peak': peak / 1024,
+        }
@@ -0,0 +1,52 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+from employees.models import Employee
+from employees.serializers import EmployeeSerializer
+
+
+class Command(BaseCommand):
+    """Django command to compare the JSON renderers and parsers"""
+    help = ('Time JSONRenderer/JSONParser against FastJSONRenderer/'
+            'FastJSONParser on employees, e.g. from seed_bench')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        employees = Employee.objects.select_related('department') \
+            .order_by('id')[:options['rows']]
+        data = EmployeeSerializer(employees, many=True).data
+        if not data:
+            raise CommandError('No employees, run seed_bench first')
+
+        body = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != body:
+            raise CommandError('FastJSONRenderer output differs')
+
+        self.stdout.write(f'{len(data)} rows, {len(body) / 1024:.0f} KiB')
+        for name, func in (
+            ('JSONRenderer', lambda: JSONRenderer().render(data)),
+            ('FastJSONRenderer', lambda: FastJSONRenderer().render(data)),
+            ('JSONParser',
+             lambda: JSONParser().parse(io.BytesIO(body))),
+            ('FastJSONParser',
+             lambda: FastJSONParser().parse(io.BytesIO(body))),
+        ):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(f'{name:<18} median '
+                              f'{statistics.median(timings):8.2f} ms, '
+                              f'best {min(timings):8.2f} ms')
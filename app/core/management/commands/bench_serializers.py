@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from employees.models import Employee
+from employees.serializers import EmployeeDetailsSerializer
+
+
+class Command(BaseCommand):
+    """Django command to compare serializing instances and values"""
+    help = ('Time EmployeeDetailsSerializer on instances against its '
+            'representation of .values() rows, e.g. on seed_bench data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        context = {'request': RequestFactory().get('/')}
+
+        def instances():
+            queryset = Employee.objects.select_related('department') \
+                .order_by('id')[:rows]
+            return EmployeeDetailsSerializer(queryset, many=True,
+                                             context=context).data
+
+        def values():
+            serializer = EmployeeDetailsSerializer(context=context)
+            lookups, represent = serializer.get_values_representation()
+            queryset = Employee.objects.order_by('id').values(*lookups)
+            return [represent(row) for row in queryset[:rows]]
+
+        expected = instances()
+        if not expected:
+            raise CommandError('No employees, run seed_bench first')
+        if values() != expected:
+            raise CommandError('Values representation differs')
+
+        self.stdout.write(f'{len(expected)} rows, queries included')
+        medians = {}
+        for name, func in (('instances', instances), ('values', values)):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+            medians[name] = statistics.median(timings)
+            self.stdout.write(f'{name:<10} median {medians[name]:8.2f} ms, '
+                              f'best {min(timings):8.2f} ms')
+        speedup = medians['instances'] / medians['values']
+        self.stdout.write(f'speedup {speedup:.1f}x')
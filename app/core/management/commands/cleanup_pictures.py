@@ -0,0 +1,73 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from employees.models import Employee
+from employees.thumbnails import thumbnail_names
+
+
+class Command(BaseCommand):
+    """Django command to delete pictures no employee references"""
+    help = 'Delete orphaned employee pictures and their thumbnails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Skip files modified less than this many seconds ago, '
+                 'which may belong to uncommitted uploads'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        storage = Employee._meta.get_field('picture').storage
+        root = storage.path('pictures')
+        cutoff = time.time() - options['min_age']
+
+        scanned = deleted = 0
+        for batch in self.batches(self.scan(root, cutoff),
+                                  options['batch_size']):
+            names = {os.path.relpath(path, storage.location)
+                     .replace(os.sep, '/') for path in batch}
+            referenced = set(Employee.objects.filter(picture__in=names)
+                             .values_list('picture', flat=True).distinct())
+            for name in names - referenced:
+                if not options['dry_run']:
+                    storage.delete(name)
+                    for thumbnail in thumbnail_names(name).values():
+                        storage.delete(thumbnail)
+                deleted += 1
+            scanned += len(names)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} of {scanned} pictures'
+        ))
+
+    def scan(self, root, cutoff):
+        """Yield paths of pictures older than cutoff, one at a time"""
+        stack = [root]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != 'thumbnails':
+                            stack.append(entry.path)
+                    elif entry.stat().st_mtime < cutoff:
+                        yield entry.path
+
+    def batches(self, iterable, size):
+        """Yield lists of at most size items"""
+        batch = []
+        for item in iterable:
+            batch.append(item)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
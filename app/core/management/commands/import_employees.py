@@ -0,0 +1,143 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from departments.models import Department
+from employees.models import Employee
+from employees.serializers import EmployeeBulkSerializer
+
+
+class Command(BaseCommand):
+    """Django command to import employees from a CSV or NDJSON file"""
+    help = 'Import employees in batches from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'ndjson'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording imported rows, to resume an interrupted '
+                 'import (default: PATH.checkpoint)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or self.guess_format(path)
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        batch_size = options['batch_size']
+
+        departments = {}
+        for name, pk in Department.objects.order_by('id') \
+                .values_list('name', 'id'):
+            departments.setdefault(name, pk)
+
+        done = self.read_checkpoint(checkpoint)
+        if done:
+            self.stdout.write(f'Resuming after {done} rows')
+
+        imported = skipped = 0
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = itertools.islice(self.read_rows(file, file_format),
+                                    done, None)
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+
+                created, errors = self.import_batch(batch, departments)
+                for index, error in errors:
+                    self.stderr.write(f'Row {done + index + 1}: '
+                                      f'{json.dumps(error)}')
+
+                done += len(batch)
+                imported += created
+                skipped += len(errors)
+                self.write_checkpoint(checkpoint, done)
+
+                rate = imported / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f'Imported {imported} rows, skipped '
+                                  f'{skipped} ({rate:.0f} rows/s)')
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} employees, skipped {skipped}'
+        ))
+
+    def guess_format(self, path):
+        """Return the file format from the file extension"""
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.csv':
+            return 'csv'
+        if ext in ('.ndjson', '.jsonl'):
+            return 'ndjson'
+        raise CommandError('Unknown file format, pass --format')
+
+    def read_rows(self, file, file_format):
+        """Yield rows of the file as dicts, one at a time"""
+        if file_format == 'csv':
+            for row in csv.DictReader(file):
+                # CSV has no null, so empty cells stand for missing values
+                yield {key: value for key, value in row.items()
+                       if value != ''}
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    def import_batch(self, batch, departments):
+        """Validate and insert a batch, returning (created, errors)"""
+        errors = {}
+        rows = []
+        for index, row in enumerate(batch):
+            name = row.get('department')
+            if name not in departments:
+                errors[index] = {'department': [
+                    f'Department "{name}" does not exist.'
+                ]}
+            rows.append({**row, 'department': departments.get(name)})
+
+        # Validate the remaining rows again after dropping the invalid ones,
+        # so a bad row only costs itself instead of the whole batch. A row
+        # can turn invalid meanwhile, e.g. by a concurrent insert, so repeat
+        # until the rest validates.
+        indexes = list(range(len(rows)))
+        while True:
+            serializer = EmployeeBulkSerializer(
+                data=[rows[index] for index in indexes], many=True
+            )
+            if serializer.is_valid():
+                break
+            if not isinstance(serializer.errors, list):
+                raise CommandError(json.dumps(serializer.errors))
+            for index, error in zip(indexes, serializer.errors):
+                if error:
+                    errors.setdefault(index, error)
+            indexes = [index for index in indexes if index not in errors]
+
+        with transaction.atomic():
+            Employee.objects.bulk_create(
+                [Employee(**attrs) for attrs in serializer.validated_data]
+            )
+        return len(serializer.validated_data), sorted(errors.items())
+
+    def read_checkpoint(self, checkpoint):
+        """Return the number of rows already imported"""
+        try:
+            with open(checkpoint) as file:
+                return int(file.read())
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, checkpoint, done):
+        """Atomically record the number of rows imported"""
+        with open(f'{checkpoint}.tmp', 'w') as file:
+            file.write(str(done))
+        os.replace(f'{checkpoint}.tmp', checkpoint)
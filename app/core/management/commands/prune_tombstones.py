@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.changes import CHANGE_FEED_SETTINGS
+from core.models import Tombstone
+
+
+class Command(BaseCommand):
+    """Django command to delete tombstones past the change feed retention"""
+    help = 'Delete tombstones older than CHANGE_FEED RETENTION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(
+            days=CHANGE_FEED_SETTINGS['RETENTION_DAYS'])
+
+        deleted = 0
+        while True:
+            pks = list(Tombstone.objects.filter(deleted_at__lt=cutoff)
+                       .order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            deleted += Tombstone.objects.filter(pk__in=pks).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} tombstones'
+        ))
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+
+from core.events import publish_change
+from departments.models import Department
+from employees.models import Employee
+
+
+class Command(BaseCommand):
+    """Django command to repair denormalized department fields"""
+    help = ('Recompute department employee and manager counts and the '
+            'department name copied to employees')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts_fixed = names_fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(Department.objects.filter(pk__gt=last_pk)
+                       .order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            with transaction.atomic():
+                # locked, so count increments of concurrent writes wait
+                # for the recount instead of being overwritten by it
+                departments = list(
+                    Department.objects.select_for_update()
+                    .filter(pk__in=pks).order_by('pk')
+                    .only('name', 'employee_count', 'manager_count')
+                )
+                counts_fixed += self.reconcile_counts(departments)
+                names_fixed += self.reconcile_names(departments)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed counts of {counts_fixed} departments and the department '
+            f'name of {names_fixed} employees'
+        ))
+
+    def reconcile_counts(self, departments):
+        """Update the departments whose counts drifted, return how many"""
+        counts = {
+            row['department']: row for row in Employee.objects
+            .filter(department__in=departments).order_by()
+            .values('department')
+            .annotate(employee_count=Count('pk'),
+                      manager_count=Count('pk', filter=Q(is_manager=True)))
+        }
+
+        drifted = []
+        for department in departments:
+            row = counts.get(department.pk, {})
+            employee_count = row.get('employee_count', 0)
+            manager_count = row.get('manager_count', 0)
+            if (department.employee_count, department.manager_count) != \
+                    (employee_count, manager_count):
+                department.employee_count = employee_count
+                department.manager_count = manager_count
+                drifted.append(department)
+
+        if drifted:
+            Department.objects.bulk_update(
+                drifted, ['employee_count', 'manager_count'])
+        return len(drifted)
+
+    def reconcile_names(self, departments):
+        """Copy department names to employees missing them, return how many"""
+        renamed = []
+        for department in departments:
+            pks = list(department.employee_set
+                       .exclude(department_name=department.name)
+                       .values_list('pk', flat=True))
+            if pks:
+                Employee.objects.filter(pk__in=pks).update(
+                    department_name=department.name,
+                    updated_at=timezone.now()
+                )
+                renamed += pks
+
+        if renamed:
+            publish_change('employees', 'employee.updated', renamed)
+        return len(renamed)
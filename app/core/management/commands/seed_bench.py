@@ -0,0 +1,97 @@
+import datetime
+import itertools
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from departments.models import Department, batch_counts
+from employees.models import Employee
+
+DEPARTMENT_PREFIX = 'Bench department'
+EMAIL_DOMAIN = 'bench.example.com'
+FIRST_NAMES = ('James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer',
+               'Michael', 'Linda', 'David', 'Elizabeth', 'William', 'Susan')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia',
+              'Miller', 'Davis', 'Rodriguez', 'Martinez', 'Wilson', 'Moore')
+HIRED_FROM = datetime.datetime(2010, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def bench_departments():
+    """Return departments created by seed_bench"""
+    return Department.objects.filter(name__startswith=DEPARTMENT_PREFIX)
+
+
+def bench_employees():
+    """Return employees created by seed_bench"""
+    return Employee.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+class Command(BaseCommand):
+    """Django command to generate departments and employees for benchmarks"""
+    help = 'Generate deterministic departments and employees in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=50)
+        parser.add_argument('--employees', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously generated data first')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            if options['clear']:
+                with batch_counts():
+                    bench_employees().delete()
+                bench_departments().delete()
+            elif bench_departments().exists() or bench_employees().exists():
+                raise CommandError('Bench data already exists, '
+                                   'pass --clear to replace it')
+
+            Department.objects.bulk_create([
+                Department(name=f'{DEPARTMENT_PREFIX} {i:04d}',
+                           description=f'Generated department {i}')
+                for i in range(options['departments'])
+            ], batch_size=batch_size)
+            department_ids = list(bench_departments().order_by('name')
+                                  .values_list('id', flat=True))
+            if not department_ids and options['employees']:
+                raise CommandError('At least one department is required')
+
+            employees = self.generate(rng, options['employees'],
+                                      department_ids)
+            created = 0
+            while True:
+                batch = list(itertools.islice(employees, batch_size))
+                if not batch:
+                    break
+                Employee.objects.bulk_create(batch)
+                created += len(batch)
+                self.stdout.write(f'Inserted {created} employees')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(department_ids)} departments and '
+            f'{created} employees'
+        ))
+
+    def generate(self, rng, count, department_ids):
+        """Yield unsaved employees, the same ones for the same seed"""
+        for i in range(count):
+            first_name = rng.choice(FIRST_NAMES)
+            last_name = rng.choice(LAST_NAMES)
+            yield Employee(
+                first_name=first_name,
+                last_name=last_name,
+                email=f'{first_name}.{last_name}.{i}@{EMAIL_DOMAIN}'.lower(),
+                salary=Decimal(rng.randrange(300000, 9999999)) / 100,
+                hired_at=HIRED_FROM + datetime.timedelta(
+                    minutes=rng.randrange(60 * 24 * 365 * 12)
+                ),
+                department_id=rng.choice(department_ids),
+                is_manager=rng.random() < 0.1,
+            )
@@ -0,0 +1,176 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+METRICS_SETTINGS = {
+    'DJANGO_CACHE': 'default',
+    'FLUSH_INTERVAL': 10,
+    **getattr(settings, 'REQUEST_METRICS', {}),
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class RequestMetrics:
+    """Measurements of a single request
+
+    Also a `connection.execute_wrapper`, counting queries and their time.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def add_serializer_time(seconds):
+    """Add to the serializer time of the current request, if measured"""
+    metrics = current_request.get()
+    if metrics is not None:
+        metrics.serializer_time += seconds
+
+
+class ViewMetrics:
+    """Totals of the requests served by one view"""
+
+    def __init__(self):
+        self.requests = 0
+        self.duration = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    """Thread safe totals of request metrics per URL name
+
+    Totals are counted in the Django cache `REQUEST_METRICS['DJANGO_CACHE']`
+    so that every process sharing it reports the same totals. Requests are
+    added up in the process, then flushed to the cache at most every
+    `FLUSH_INTERVAL` seconds and before reading.
+    """
+    # cache counters are integers, so seconds are counted in microseconds
+    counters = ('requests', 'duration', 'queries', 'db_time',
+                'serializer_time', 'response_bytes')
+    seconds = ('duration', 'db_time', 'serializer_time')
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    @property
+    def cache(self):
+        return caches[METRICS_SETTINGS['DJANGO_CACHE']]
+
+    def make_key(self, *parts):
+        """Return a cache key of the totals"""
+        return ':'.join(('request-metrics',) + parts)
+
+    def observe(self, name, duration, metrics, response_bytes):
+        """Add a request served by the view named name"""
+        bucket = bisect.bisect_left(DURATION_BUCKETS, duration)
+        with self._lock:
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = ViewMetrics()
+            view.requests += 1
+            view.duration += duration
+            if bucket < len(DURATION_BUCKETS):
+                view.buckets[bucket] += 1
+            view.queries += metrics.queries
+            view.db_time += metrics.db_time
+            view.serializer_time += metrics.serializer_time
+            view.response_bytes += response_bytes
+
+    def flush_due(self):
+        """Return whether the totals of the process should be flushed"""
+        return time.monotonic() - self._flushed >= \
+            METRICS_SETTINGS['FLUSH_INTERVAL']
+
+    def flush(self):
+        """Add the totals of the process to the cache"""
+        with self._lock:
+            views, self._views = self._views, {}
+            self._flushed = time.monotonic()
+        if not views:
+            return
+
+        key = self.make_key('views')
+        names = self.cache.get(key, set())
+        if not names.issuperset(views):
+            # a name lost to a concurrent flush is added by the next one
+            self.cache.set(key, names | set(views), None)
+        for name, view in views.items():
+            for counter, value in self.get_counters(view).items():
+                if value:
+                    self.incr(self.make_key(name, counter), value)
+
+    def get_counters(self, view):
+        """Return the cache counters of a view's totals"""
+        counters = {f'bucket{i}': count
+                    for i, count in enumerate(view.buckets)}
+        for counter in self.counters:
+            value = getattr(view, counter)
+            counters[counter] = round(value * 1000000) \
+                if counter in self.seconds else value
+        return counters
+
+    def incr(self, key, delta):
+        """Increment a counter"""
+        try:
+            self.cache.incr(key, delta)
+        except ValueError:
+            if not self.cache.add(key, delta, None):
+                self.cache.incr(key, delta)
+
+    def snapshot(self):
+        """Return the totals of every process mapped by URL name"""
+        self.flush()
+        names = sorted(self.cache.get(self.make_key('views'), ()))
+        counters = list(self.get_counters(ViewMetrics()))
+        stored = self.cache.get_many([self.make_key(name, counter)
+                                      for name in names
+                                      for counter in counters])
+
+        snapshot = {}
+        for name in names:
+            values = {counter: stored.get(self.make_key(name, counter), 0)
+                      for counter in counters}
+            view = snapshot[name] = ViewMetrics()
+            view.buckets = [values[f'bucket{i}']
+                            for i in range(len(DURATION_BUCKETS))]
+            for counter in self.counters:
+                setattr(view, counter, values[counter] / 1000000
+                        if counter in self.seconds else values[counter])
+        return snapshot
+
+    def clear(self):
+        """Remove every total"""
+        with self._lock:
+            self._views.clear()
+        names = self.cache.get(self.make_key('views'), ())
+        counters = list(self.get_counters(ViewMetrics()))
+        self.cache.delete_many([self.make_key('views')] + [
+            self.make_key(name, counter)
+            for name in names for counter in counters
+        ])
+
+
+request_metrics = MetricsRegistry()
@@ -0,0 +1,113 @@
+import contextlib
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, \
+    sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import RequestMetrics, current_request, request_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_REQUEST_QUERIES': 50,
+}
+
+
+class RequestMetricsMiddleware:
+    """Middleware measuring time, queries, serialization and response size
+
+    Totals are kept per URL name for the metrics endpoint, shared by the
+    workers through the cache, and each response gets a `Server-Timing`
+    header. Requests above the slow thresholds are logged.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.settings = {**DEFAULTS,
+                         **getattr(settings, 'REQUEST_METRICS', {})}
+        if not self.settings['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                self.wrap_connections(stack, metrics)
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+        self.record(request, response, metrics,
+                    time.perf_counter() - started)
+        if request_metrics.flush_due():
+            request_metrics.flush()
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            # connections belong to the thread running the request's
+            # queries, so wrap them there
+            with contextlib.ExitStack() as stack:
+                await sync_to_async(self.wrap_connections)(stack, metrics)
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    await sync_to_async(stack.close)()
+        finally:
+            current_request.reset(token)
+
+        self.record(request, response, metrics,
+                    time.perf_counter() - started)
+        if request_metrics.flush_due():
+            await sync_to_async(request_metrics.flush)()
+        return response
+
+    @staticmethod
+    def wrap_connections(stack, metrics):
+        """Count the queries of this thread's connections in metrics"""
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+
+    def record(self, request, response, metrics, duration):
+        """Add a served request to the totals, header and slow log"""
+        # Streamed bodies are sent after this returns, so aren't counted
+        size = 0 if response.streaming else len(response.content)
+        match = request.resolver_match
+        name = match.view_name if match else '<unresolved>'
+        request_metrics.observe(name, duration, metrics, size)
+
+        if self.settings['SERVER_TIMING']:
+            response['Server-Timing'] = ', '.join((
+                f'app;dur={duration * 1000:.2f}',
+                f'db;dur={metrics.db_time * 1000:.2f};'
+                f'desc="{metrics.queries} queries"',
+                f'serializer;dur={metrics.serializer_time * 1000:.2f}',
+            ))
+
+        if (duration * 1000 > self.settings['SLOW_REQUEST_MS']
+                or metrics.queries > self.settings['SLOW_REQUEST_QUERIES']):
+            logger.warning(
+                'Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms',
+                request.method, request.get_full_path(), name,
+                duration * 1000, metrics.queries, metrics.db_time * 1000,
+            )
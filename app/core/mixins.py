@@ -0,0 +1,440 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, Subquery
+from django.http import Http404
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date_safe
+
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+from .db.fanout import run_query
+from .metrics import add_serializer_time
+from .models import Tombstone
+
+CONDITIONAL_HEADERS = ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH',
+                       'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+class AsyncAPIViewMixin:
+    """Mixin dispatching GET and HEAD requests to an async `aget`
+
+    Authentication awaits `aauthenticate()` when the authenticator has one.
+    Other methods are dispatched synchronously in the request's thread.
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        """Dispatch the request, awaiting the handler of reads"""
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(super().dispatch)(
+                request, *args, **kwargs)
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            # permissions and throttles may block, e.g. on a shared cache
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await self.aget(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response,
+                                               *args, **kwargs)
+        return self.response
+
+    async def aperform_authentication(self, request):
+        """Set the user and auth of the request, as `request.user` would"""
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, 'aauthenticate', None) \
+                or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+
+        request._not_authenticated()
+
+    async def apaginate_queryset(self, queryset):
+        """Return a page of results, or None if pagination is disabled"""
+        if self.paginator is None:
+            return None
+        paginate = getattr(self.paginator, 'apaginate_queryset', None) \
+            or sync_to_async(self.paginator.paginate_queryset)
+        return await paginate(queryset, self.request, view=self)
+
+
+class AsyncListMixin(AsyncAPIViewMixin):
+    """Mixin listing objects with the async ORM"""
+
+    async def aget(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        """List objects, like `ListModelMixin.list`"""
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        instances = [instance async for instance in queryset]
+        return Response(self.get_serializer(instances, many=True).data)
+
+
+class AsyncRetrieveMixin(AsyncAPIViewMixin):
+    """Mixin retrieving an object with the async ORM"""
+
+    async def aget(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """Retrieve an object, like `RetrieveModelMixin.retrieve`"""
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+    async def aget_object(self):
+        """Return the object of the view, like `get_object()`"""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError,
+                ValidationError):
+            raise Http404
+
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+
+class ConditionalGetMixin:
+    """Mixin answering list and retrieve GETs with 304 Not Modified
+
+    Representations are versioned by the latest of `last_modified_fields`
+    (datetime fields, possibly across relations). Lists are versioned by an
+    aggregate MAX of those fields and of the latest deletion of the model,
+    plus a row count, so an unchanged resource is answered without
+    serializing anything.
+    """
+    last_modified_fields = ('updated_at',)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve an object unless the client copy is current"""
+        return self.instance_response(request, self.get_object())
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """Retrieve an object unless the client copy is current"""
+        return self.instance_response(request, await self.aget_object())
+
+    def instance_response(self, request, instance):
+        """Return 304 if the client copy of instance is current"""
+        last_modified = max(self.get_field_value(instance, field)
+                            for field in self.last_modified_fields)
+
+        return self.conditional_response(
+            request, (instance.pk, last_modified), last_modified,
+            lambda: Response(self.get_serializer(instance).data)
+        )
+
+    def list(self, request, *args, **kwargs):
+        """List objects unless the client copy is current"""
+        queryset = self.filter_queryset(self.get_queryset())
+        version, last_modified = self.get_list_version(queryset)
+
+        return self.conditional_response(
+            request, version, last_modified,
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs)
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        """List objects unless the client copy is current
+
+        Without conditional headers the page can't be answered with 304 or
+        412, so it is fetched concurrently with the validators.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if not any(header in request.META for header in CONDITIONAL_HEADERS):
+            (version, last_modified), response = await asyncio.gather(
+                run_query(self.get_list_version, queryset),
+                super().alist(request, *args, **kwargs)
+            )
+            return self.add_validators(
+                response, *self.get_validators(request, version,
+                                               last_modified))
+
+        version, last_modified = await run_query(self.get_list_version,
+                                                 queryset)
+        etag, timestamp = self.get_validators(request, version, last_modified)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=timestamp)
+        if response is None:
+            response = await super().alist(request, *args, **kwargs)
+        return self.add_validators(response, etag, timestamp)
+
+    def get_list_version(self, queryset):
+        """Return the version and last modification time of a list"""
+        deleted = Tombstone.objects \
+            .filter(model=queryset.model._meta.label_lower) \
+            .order_by('-deleted_at').values('deleted_at')[:1]
+        aggregates = queryset.order_by().aggregate(
+            count=Count('pk'),
+            # deletions change a list without changing the rows left
+            deleted_at=Max(Subquery(deleted)),
+            **{field: Max(field) for field in self.last_modified_fields}
+        )
+        count = aggregates.pop('count')
+        last_modified = max(filter(None, aggregates.values()), default=None)
+        return (count, last_modified), last_modified
+
+    def conditional_response(self, request, version, last_modified,
+                             get_response):
+        """Return 304 if the validators match, else the full response"""
+        etag, timestamp = self.get_validators(request, version, last_modified)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=timestamp)
+        if response is None:
+            response = get_response()
+        return self.add_validators(response, etag, timestamp)
+
+    def get_validators(self, request, version, last_modified):
+        """Return the ETag and Last-Modified timestamp of a version"""
+        etag = self.get_etag(request, version)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp
+
+    @staticmethod
+    def add_validators(response, etag, timestamp):
+        """Set the ETag and Last-Modified headers of response"""
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def get_etag(self, request, version):
+        """Return a strong ETag for this version of the representation"""
+        seed = repr((version, request.get_full_path(),
+                     getattr(request, 'accepted_media_type', None)))
+        return quote_etag(hashlib.md5(seed.encode()).hexdigest())
+
+    @staticmethod
+    def get_field_value(instance, field):
+        """Return the value of a field, following `__` relations"""
+        for name in field.split('__'):
+            instance = getattr(instance, name)
+        return instance
+
+
+class CachedResponseMixin:
+    """Mixin serving list and retrieve GETs from a `VersionedCache`
+
+    The serialized data and its validators are cached per URL and media
+    type in `response_cache`, which signal handlers bump on writes.
+    """
+    response_cache = None
+    cached_headers = ('ETag', 'Last-Modified')
+
+    def list(self, request, *args, **kwargs):
+        """List objects from the cache when possible"""
+        return self.cached_response(
+            request,
+            lambda: super(CachedResponseMixin, self).list(
+                request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve an object from the cache when possible"""
+        return self.cached_response(
+            request,
+            lambda: super(CachedResponseMixin, self).retrieve(
+                request, *args, **kwargs)
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        """List objects from the cache when possible"""
+        return await self.acached_response(
+            request, lambda: super(CachedResponseMixin, self).alist(
+                request, *args, **kwargs)
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """Retrieve an object from the cache when possible"""
+        return await self.acached_response(
+            request, lambda: super(CachedResponseMixin, self).aretrieve(
+                request, *args, **kwargs)
+        )
+
+    def cached_response(self, request, get_response):
+        """Return the cached response, or compute and cache it"""
+        key = self.get_cache_key(request)
+        version, cached = self.read_cache(key)
+        if cached is not None:
+            return self.get_cached_response(request, cached)
+
+        response = get_response()
+        self.write_cache(key, version, response)
+        return response
+
+    async def acached_response(self, request, get_response):
+        """Return the cached response, or await and cache it"""
+        key = self.get_cache_key(request)
+        version, cached = await sync_to_async(self.read_cache)(key)
+        if cached is not None:
+            return self.get_cached_response(request, cached)
+
+        response = await get_response()
+        await sync_to_async(self.write_cache)(key, version, response)
+        return response
+
+    def get_cache_key(self, request):
+        """Return the cache key of the response to request"""
+        seed = repr((request.get_full_path(),
+                     getattr(request, 'accepted_media_type', None)))
+        return hashlib.md5(seed.encode()).hexdigest()
+
+    def read_cache(self, key):
+        """Return the current version and the entry for key in it"""
+        version = self.response_cache.version()
+        return version, self.response_cache.get(key, version)
+
+    def write_cache(self, key, version, response):
+        """Cache the data and validators of a successful response"""
+        if response.status_code != 200:
+            return
+        headers = {header: response[header]
+                   for header in self.cached_headers
+                   if header in response}
+        self.response_cache.set(key, (response.data, headers), version)
+
+    def get_cached_response(self, request, cached):
+        """Return the response for a cache entry, or 304 if current"""
+        data, headers = cached
+        response = get_conditional_response(
+            request, etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(headers.get('Last-Modified'))
+        )
+        if response is None:
+            response = Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+
+class SparseFieldsMixin:
+    """Mixin passing `?fields=` and `?expand=` on GETs to the serializer
+
+    The queryset is narrowed with `.only()` to the lookups read by the
+    selected fields, plus those needed for validators and ordering.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer, narrowed for GET requests"""
+        request = getattr(self, 'request', None)
+        if request is not None and request.method == 'GET':
+            kwargs.setdefault('fields', self.get_query_list('fields'))
+            kwargs.setdefault('expand', self.get_query_list('expand'))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        """Return the queryset, loading only the fields to serialize"""
+        queryset = super().get_queryset()
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET' or not (
+                self.get_query_list('fields')
+                or self.get_query_list('expand')):
+            return queryset
+
+        lookups = self.get_serializer().get_projection()
+        if lookups is None:
+            return queryset
+
+        lookups = set(lookups) | set(self.get_projection_extras(queryset))
+        relations = {lookup.rsplit('__', 1)[0] for lookup in lookups
+                     if '__' in lookup}
+        return queryset.select_related(None).select_related(*relations) \
+            .only(*lookups)
+
+    def get_projection_extras(self, queryset):
+        """Return lookups read by the view besides the serializer"""
+        extras = list(getattr(self, 'last_modified_fields', ()))
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        extras.extend([ordering] if isinstance(ordering, str) else ordering)
+        for backend in self.filter_backends:
+            if hasattr(backend, 'get_ordering'):
+                extras.extend(backend().get_ordering(
+                    self.request, queryset, self) or ())
+        return [field.lstrip('-') for field in extras]
+
+    def get_query_list(self, name):
+        """Return a comma separated query parameter as a list"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class ValuesListMixin(SparseFieldsMixin):
+    """Mixin serializing list GETs from `.values()` rows
+
+    Rows are represented by the serializer's `get_values_representation()`,
+    skipping model instances and field machinery, or by the serializer
+    itself when some field can't be represented from values.
+    """
+
+    def list(self, request, *args, **kwargs):
+        """List objects serialized from values"""
+        values = self.get_serializer().get_values_representation()
+        if values is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_values_queryset(values[0])
+        page = self.paginate_queryset(queryset)
+        return self.values_response(queryset if page is None else page,
+                                    values[1], page is not None)
+
+    async def alist(self, request, *args, **kwargs):
+        """List objects serialized from values read with the async ORM"""
+        values = self.get_serializer().get_values_representation()
+        if values is None:
+            return await super().alist(request, *args, **kwargs)
+
+        queryset = self.get_values_queryset(values[0])
+        page = await self.apaginate_queryset(queryset)
+        if page is None:
+            rows = [row async for row in queryset]
+        return self.values_response(rows if page is None else page,
+                                    values[1], page is not None)
+
+    def get_values_queryset(self, lookups):
+        """Return the filtered queryset of values rows to list"""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookups = dict.fromkeys([*lookups,
+                                 *self.get_projection_extras(queryset)])
+        return queryset.values(*lookups)
+
+    def values_response(self, rows, represent, paginated):
+        """Return the response listing represented rows"""
+        started = time.perf_counter()
+        data = [represent(row) for row in rows]
+        add_serializer_time(time.perf_counter() - started)
+
+        if not paginated:
+            return Response(data)
+        return self.get_paginated_response(data)
@@ -0,0 +1,24 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Tombstone(models.Model):
+    """Record of a deleted object, read by change feeds"""
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted_at', 'id'],
+                         name='tombstone_model_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+    @classmethod
+    def record(cls, instance):
+        """Create the tombstone of a deleted model instance"""
+        return cls.objects.create(model=instance._meta.label_lower,
+                                  object_id=instance.pk)
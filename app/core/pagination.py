@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination ordered by creation time, then id
+
+    The cursor is an opaque token holding the last seen `created_at`, so
+    deep pages are an index range scan instead of an OFFSET over the table.
+    """
+    ordering = ('created_at', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
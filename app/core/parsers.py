@@ -0,0 +1,37 @@
+import io
+
+from django.conf import settings
+
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """JSON parser backed by orjson
+
+    Falls back to JSONParser when orjson isn't installed or the request
+    isn't UTF-8 encoded. Unlike json, orjson reads integers over 64 bits
+    as floats, which no API field accepts anyway.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming bytestream as JSON"""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        data = stream.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Let JSONParser raise its usual error
+            return super().parse(io.BytesIO(data), media_type,
+                                 parser_context)
@@ -0,0 +1,148 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# types orjson can't serialize (Decimal, lazy strings, ...) are converted
+# the same way as by the DRF encoder
+default_encoder = encoders.JSONEncoder()
+
+
+def orjson_dumps(data):
+    """Return data as compact UTF-8 JSON bytes, using orjson"""
+    return orjson.dumps(data, default=default_encoder.default,
+                        option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+class Echo:
+    """File-like object that returns what is written instead of buffering"""
+
+    def write(self, value):
+        return value
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Renderer for plain text such as Prometheus metrics"""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render text as is, or other data as its string form"""
+        return str(data).encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer backed by orjson, with the output of JSONRenderer
+
+    Falls back to JSONRenderer when orjson isn't installed, or for output
+    orjson can't produce: indentation, ASCII only or non compact JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into JSON, returning a bytestring"""
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        if data is None:
+            return b''
+
+        try:
+            ret = orjson_dumps(data)
+        except orjson.JSONEncodeError:
+            # e.g. integers over 64 bits, which the json module handles
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        # Escape like JSONRenderer so the output is a javascript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028') \
+                .replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renderer for newline delimited JSON, one object per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a list (or a single object) of rows"""
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(self.iter_render(rows))
+
+    def iter_render(self, rows, fields=None):
+        """Yield rows encoded one line at a time"""
+        if orjson is not None:
+            for row in rows:
+                yield orjson_dumps(row) + b'\n'
+            return
+
+        for row in rows:
+            line = json.dumps(row, cls=encoders.JSONEncoder,
+                              ensure_ascii=False)
+            yield f'{line}\n'.encode(self.charset)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renderer for Server-Sent Events with JSON data"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data, such as an error, as a single `error` event"""
+        return self.render_event('error', data)
+
+    def render_event(self, name, data):
+        """Return one event, its data as a single line of JSON"""
+        if orjson is not None:
+            line = orjson_dumps(data)
+        else:
+            line = json.dumps(data, cls=encoders.JSONEncoder,
+                              ensure_ascii=False).encode(self.charset)
+        name = name.encode(self.charset)
+        return b'event: %s\ndata: %s\n\n' % (name, line)
+
+
+class CSVRenderer(BaseRenderer):
+    """Renderer for CSV with a header row"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a list (or a single object) of rows"""
+        if not data:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(self.iter_render(rows, list(rows[0])))
+
+    def iter_render(self, rows, fields):
+        """Yield the header, then rows encoded one line at a time
+
+        Nested values, such as objects and lists, are written as JSON.
+        """
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields).encode(self.charset)
+        for row in rows:
+            values = [self.encode_value(row.get(field)) for field in fields]
+            yield writer.writerow(values).encode(self.charset)
+
+    def encode_value(self, value):
+        """Return a cell value, JSON for nested values"""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, cls=encoders.JSONEncoder,
+                              ensure_ascii=False)
+        return value
@@ -0,0 +1,231 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.functional import cached_property
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .metrics import add_serializer_time
+
+
+class DynamicFieldsMixin:
+    """Serializer mixin taking `fields` and `expand` keyword arguments
+
+    `fields` restricts the output to the named fields. `expand` replaces
+    the named fields with the serializers in `expandable_fields`.
+    `projections` maps field names to the model lookups they read, for
+    fields whose lookups can't be derived from their source.
+
+    `get_values_representation()` serializes rows of `.values()` with the
+    same output, without model instances or per field attribute lookups.
+    """
+    expandable_fields = {}
+    projections = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        for name in expand or ():
+            if name in self.expandable_fields:
+                self.fields[name] = self.expandable_fields[name](
+                    read_only=True
+                )
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        """Serialize instance, adding the time taken to request metrics"""
+        if self.is_nested:
+            return super().to_representation(instance)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            add_serializer_time(time.perf_counter() - started)
+
+    @cached_property
+    def is_nested(self):
+        """Return whether a parent serializer already times this one"""
+        parent = self.parent
+        while parent is not None:
+            if isinstance(parent, DynamicFieldsMixin):
+                return True
+            parent = parent.parent
+        return False
+
+    def get_projection(self):
+        """Return the model lookups read by the fields, or None if unknown"""
+        opts = self.Meta.model._meta
+        lookups = [opts.pk.name]
+        for name, field in self.fields.items():
+            if isinstance(field, DynamicFieldsMixin):
+                nested = field.get_projection()
+                if nested is None:
+                    return None
+                lookups.extend(f'{field.source}__{lookup}'
+                               for lookup in nested)
+                continue
+
+            if name in self.projections:
+                lookups.extend(self.projections[name])
+                continue
+
+            if field.source == '*' or '.' in field.source:
+                return None
+            try:
+                model_field = opts.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if model_field.is_relation and not isinstance(
+                    field, serializers.PrimaryKeyRelatedField):
+                return None
+            lookups.append(field.source)
+
+        return lookups
+
+    def get_values_representation(self, prefix=''):
+        """Return (lookups, represent) to serialize `.values()` rows
+
+        `represent(row)` returns what `to_representation` does for the
+        instance of a row of `queryset.values(*lookups)`. Returns None when
+        some field can't be represented from values.
+        """
+        opts = self.Meta.model._meta
+        pk = f'{prefix}{opts.pk.name}'
+        lookups = [pk]
+        items = []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, DynamicFieldsMixin):
+                nested = field.get_values_representation(
+                    f'{prefix}{field.source}__'
+                )
+                if nested is None:
+                    return None
+                lookups.extend(nested[0])
+                items.append((name, None, nested[1]))
+                continue
+
+            converter = self.get_converter(name, field)
+            if converter is None:
+                return None
+            lookup, convert = converter
+            lookups.append(f'{prefix}{lookup}')
+            items.append((name, f'{prefix}{lookup}', convert))
+
+        def represent(row):
+            if prefix and row[pk] is None:
+                return None
+            ret = {}
+            for name, key, convert in items:
+                if key is None:
+                    ret[name] = convert(row)
+                    continue
+                value = row[key]
+                if value is None or convert is None:
+                    ret[name] = value
+                else:
+                    ret[name] = convert(value)
+            return ret
+
+        return list(dict.fromkeys(lookups)), represent
+
+    def get_converter(self, name, field):
+        """Return (lookup, convert) representing a field from its value
+
+        `convert` takes the non null value of the lookup, or is None when
+        the value is its own representation. Returns None if unsupported.
+        """
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = self.Meta.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        source = field.source
+        to_representation = type(field).to_representation
+
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                return source, field.pk_field.to_representation
+            return source, None
+        if model_field.is_relation or isinstance(
+                field, (serializers.RelatedField,
+                        serializers.SerializerMethodField)):
+            return None
+
+        if to_representation in (serializers.CharField.to_representation,
+                                 serializers.IntegerField.to_representation):
+            return source, None
+        if to_representation is serializers.BooleanField.to_representation:
+            return source, bool
+        if to_representation is serializers.FileField.to_representation:
+            return source, self.get_file_converter(field, model_field)
+        if to_representation is serializers.DecimalField.to_representation:
+            return source, self.get_decimal_converter(field)
+        if to_representation is serializers.DateTimeField.to_representation:
+            return source, self.get_datetime_converter(field)
+        return source, field.to_representation
+
+    @staticmethod
+    def get_file_converter(field, model_field):
+        """Return a converter of file names to URLs, as FileField does"""
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return lambda name: name or None
+
+        storage = model_field.storage
+        request = field.context.get('request')
+
+        def convert(name):
+            if not name:
+                return None
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+        return convert
+
+    @staticmethod
+    def get_decimal_converter(field):
+        """Return a converter of decimals to strings, as DecimalField does"""
+        if (not getattr(field, 'coerce_to_string',
+                        api_settings.COERCE_DECIMAL_TO_STRING)
+                or field.localize or field.rounding is not None
+                or field.decimal_places is None
+                or getattr(field, 'normalize_output', False)):
+            return field.to_representation
+
+        spec = f'.{field.decimal_places}f'
+
+        def convert(value):
+            # values from the database already have decimal_places digits
+            if isinstance(value, Decimal):
+                return format(value, spec)
+            return field.to_representation(value)
+        return convert
+
+    @staticmethod
+    def get_datetime_converter(field):
+        """Return a converter of datetimes to ISO 8601, as DateTimeField"""
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        timezone = getattr(field, 'timezone', field.default_timezone())
+        if (output_format is None or output_format.lower() != ISO_8601
+                or timezone is None):
+            return field.to_representation
+
+        utc = (timezone is datetime.timezone.utc
+               or getattr(timezone, 'key', None) in ('UTC', 'Etc/UTC'))
+
+        def convert(value):
+            if utc and value.tzinfo is datetime.timezone.utc:
+                # as read by the database backends, no conversion needed
+                return value.isoformat()[:-6] + 'Z'
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
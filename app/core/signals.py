@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Drop a deleted token from the authentication cache on commit"""
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_token(key))
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop the tokens of a changed user from the authentication cache
+
+    Invalidating before commit would let a concurrent request cache the
+    user as it was.
+    """
+    if created:
+        return
+    keys = list(Token.objects.filter(user=instance)
+                .values_list('key', flat=True))
+
+    def invalidate():
+        for key in keys:
+            invalidate_token(key)
+
+    transaction.on_commit(invalidate)
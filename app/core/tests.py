@@ -0,0 +1,1251 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+import asyncio
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from unittest import mock
+
+from PIL import Image
+
+from departments.cache import department_cache
+from departments.models import Department
+from employees.models import Employee
+from employees.serializers import EmployeeBulkListSerializer
+
+from .authentication import CachedTokenAuthentication, token_cache
+from . import parsers, renderers
+from .cache import LRUCache, VersionedCache
+from .db.backends.sqlite3.base import DatabaseWrapper
+from .db.fanout import run_query
+from .events import EVENTS_SETTINGS, OVERFLOW, CacheBackend, \
+    LocalBackend, broker
+from .models import Tombstone
+from .throttling import BaseBucketBackend, CacheBucketBackend, \
+    TokenBucketThrottle, buckets
+from .db.pool import ConnectionPool, PoolTimeout
+from .metrics import METRICS_SETTINGS, MetricsRegistry, RequestMetrics, \
+    request_metrics
+
+
+USER_DETAILS_URL = reverse('users:user-details')
+METRICS_URL = reverse('metrics')
+EVENTS_URL = reverse('events')
+EMPLOYEES_URL = reverse('employees:employee-list')
+CREATE_TOKEN_URL = reverse('users:token-create')
+
+
+class LRUCacheTests(TestCase):
+    """Test the in-process LRU cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entry is evicted when full"""
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire(self):
+        """Test entries are dropped after their timeout"""
+        cache = LRUCache(timeout=10)
+        with mock.patch('core.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('core.cache.time.monotonic', return_value=105):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('core.cache.time.monotonic', return_value=110):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test the cached token authentication backend"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test_user',
+            'password123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient(
+            HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_token_lookup_cached(self):
+        """Test the token is looked up once for repeated requests"""
+        self.client.get(USER_DETAILS_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(USER_DETAILS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries
+                          if 'authtoken_token' in query['sql']])
+        self.assertEqual(res.data['username'], self.user.username)
+
+    def test_async_cached_lookup_once(self):
+        """Test async authentication uses the entry it found in cache"""
+        self.client.get(USER_DETAILS_URL)
+        cached = token_cache.get(self.token.key)
+        request = APIRequestFactory().get(
+            USER_DETAILS_URL, HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+        # the entry expires right after the first lookup
+        with mock.patch.object(token_cache, 'get',
+                               side_effect=[cached, None]):
+            user, token = async_to_sync(
+                CachedTokenAuthentication().aauthenticate)(request)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_deleted_token_invalidated(self):
+        """Test a deleted token is rejected even after being cached"""
+        self.client.get(USER_DETAILS_URL)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.token.delete()
+        self.assertEqual(len(callbacks), 1)
+
+        res = self.client.get(USER_DETAILS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        """Test a deactivated user is rejected even after being cached"""
+        self.client.get(USER_DETAILS_URL)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        res = self.client.get(USER_DETAILS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@mock.patch.dict(TokenBucketThrottle.THROTTLE_RATES,
+                 employees='2/min', token='1/min')
+class TokenBucketThrottleTests(TestCase):
+    """Test the token bucket throttle"""
+
+    def setUp(self):
+        buckets.clear()
+        self.user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        buckets.clear()
+
+    def test_burst_then_throttled(self):
+        """Test requests past the burst are refused per user"""
+        for _ in range(2):
+            res = self.client.get(EMPLOYEES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(EMPLOYEES_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+
+        other = get_user_model().objects.create_superuser('other_user',
+                                                          'password123')
+        self.client.force_authenticate(other)
+        res = self.client.get(EMPLOYEES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bucket_refills(self):
+        """Test tokens are added back at the rate"""
+        with mock.patch('core.throttling.time') as clock:
+            clock.monotonic.return_value = 1000
+            self.client.get(EMPLOYEES_URL)
+            self.client.get(EMPLOYEES_URL)
+
+            clock.monotonic.return_value = 1030
+            res = self.client.get(EMPLOYEES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            res = self.client.get(EMPLOYEES_URL)
+            self.assertEqual(res.status_code,
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_token_creation_throttled(self):
+        """Test anonymous token requests are limited per address"""
+        get_user_model().objects.create_user('test_user',
+                                             password='password123')
+        payload = {'username': 'test_user', 'password': 'password123'}
+        res = APIClient().post(CREATE_TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = APIClient().post(CREATE_TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_cache_backend(self):
+        """Test buckets kept in the Django cache"""
+        backend = CacheBucketBackend()
+        cache.delete('throttle:test')
+
+        self.assertEqual(backend.consume('test', 2, 1), 0)
+        self.assertEqual(backend.consume('test', 2, 1), 0)
+        self.assertGreater(backend.consume('test', 2, 1), 0)
+        cache.delete('throttle:test')
+
+    def test_cache_backend_concurrent(self):
+        """Test a concurrent burst takes each token once"""
+        backend = CacheBucketBackend()
+        cache.delete('throttle:test')
+        waits = []
+
+        def consume():
+            waits.append(backend.consume('test', 5, 0.01))
+
+        with mock.patch.object(backend, 'take',
+                               side_effect=self.slow(backend.take)):
+            threads = [threading.Thread(target=consume) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(waits.count(0), 5)
+        cache.delete('throttle:test')
+
+    def test_cache_backend_lock_owner(self):
+        """Test an expired lock taken by another worker isn't released"""
+        backend = CacheBucketBackend()
+        cache.delete('throttle:test')
+
+        def take(*args):
+            # the lock expires and another worker takes it meanwhile
+            cache.set('throttle:test:lock', 'other')
+            return BaseBucketBackend.take(backend, *args)
+
+        with mock.patch.object(backend, 'take', side_effect=take):
+            self.assertEqual(backend.consume('test', 2, 1), 0)
+
+        self.assertEqual(cache.get('throttle:test:lock'), 'other')
+        cache.delete_many(['throttle:test', 'throttle:test:lock'])
+
+    def test_cache_backend_redis_script(self):
+        """Test Redis caches take tokens with a single script call"""
+        backend = CacheBucketBackend()
+        redis_cache = mock.Mock(spec=RedisCache)
+        redis_cache.make_and_validate_key.return_value = ':1:throttle:test'
+        client = redis_cache._cache.get_client.return_value
+        client.register_script.return_value.return_value = b'0.5'
+
+        with mock.patch('core.throttling.caches', {'default': redis_cache}):
+            self.assertEqual(backend.consume('test', 2, 1), 0.5)
+
+        client.register_script.return_value.assert_called_once_with(
+            keys=[':1:throttle:test'], args=[2, 1])
+
+    def slow(self, function):
+        """Return function delayed, so that concurrent calls overlap"""
+        def wrapper(*args):
+            time.sleep(0.005)
+            return function(*args)
+        return wrapper
+
+
+class VersionedCacheTests(TestCase):
+    """Test the versioned response cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.cache = VersionedCache('test')
+
+    def test_bump_invalidates(self):
+        """Test bumping the version invalidates stored entries"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+        self.cache.bump()
+
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_stale_version_not_current(self):
+        """Test a value computed before a bump is not served after it"""
+        version = self.cache.version()
+        self.cache.bump()
+        self.cache.set('key', 'stale', version)
+
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_metrics(self):
+        """Test counters are exposed in Prometheus text format"""
+        self.cache.get('key')
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        ))
+
+        res = client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('response_cache_misses_total{namespace="test"} 1',
+                      res.content.decode())
+
+
+class CleanupPicturesCommandTests(TestCase):
+    """Test the cleanup_pictures management command"""
+
+    def setUp(self):
+        self.storage = Employee._meta.get_field('picture').storage
+        department = Department.objects.create(name='IT',
+                                               description='IT DEPARTMENT')
+        content = io.BytesIO()
+        Image.effect_noise((10, 10), 100).convert('RGB') \
+            .save(content, format='JPEG')
+        self.employee = Employee(first_name='John', last_name='Smith',
+                                 email='john@test.com', salary=7500,
+                                 department=department)
+        self.employee.picture.save('john.jpg', ContentFile(content.getvalue()))
+        self.orphan = self.storage.save('pictures/00/orphan.jpg',
+                                        ContentFile(b'orphan'))
+
+    def tearDown(self):
+        self.employee.picture.delete()
+        self.storage.delete(self.orphan)
+
+    def test_orphans_deleted(self):
+        """Test unreferenced pictures are deleted and referenced kept"""
+        out = io.StringIO()
+        call_command('cleanup_pictures', min_age=0, batch_size=1, stdout=out)
+
+        self.assertFalse(self.storage.exists(self.orphan))
+        self.assertTrue(self.storage.exists(self.employee.picture.name))
+        self.assertIn('Deleted 1 of 2 pictures', out.getvalue())
+
+    def test_recent_files_kept(self):
+        """Test recently written files are not considered"""
+        call_command('cleanup_pictures', stdout=io.StringIO())
+
+        self.assertTrue(self.storage.exists(self.orphan))
+
+    def test_dry_run(self):
+        """Test a dry run deletes nothing"""
+        call_command('cleanup_pictures', min_age=0, dry_run=True,
+                     stdout=io.StringIO())
+
+        self.assertTrue(self.storage.exists(self.orphan))
+
+
+class ImportEmployeesCommandTests(TestCase):
+    """Test the import_employees management command"""
+
+    def setUp(self):
+        Department.objects.create(name='IT', description='IT DEPARTMENT')
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def test_import_csv(self):
+        """Test employees are imported from CSV in batches"""
+        path = self.write('employees.csv', (
+            'first_name,last_name,email,salary,department,is_manager,'
+            'hired_at\n'
+            'John,Smith,john@test.com,7500,IT,true,\n'
+            'Jane,Doe,jane@test.com,8500,IT,false,2020-01-01T00:00:00Z\n'
+            'Mark,Brown,mark@test.com,6500,IT,false,\n'
+        ))
+        out = io.StringIO()
+        call_command('import_employees', path, batch_size=2, stdout=out)
+
+        self.assertEqual(Employee.objects.count(), 3)
+        self.assertTrue(Employee.objects.get(email='john@test.com')
+                        .is_manager)
+        self.assertIn('Imported 3 employees, skipped 0', out.getvalue())
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_import_ndjson_invalid_rows_skipped(self):
+        """Test invalid rows are reported and the rest imported"""
+        rows = [
+            {'first_name': 'John', 'last_name': 'Smith',
+             'email': 'john@test.com', 'salary': 7500, 'department': 'IT'},
+            {'first_name': 'Jane', 'last_name': 'Doe',
+             'email': 'jane@test.com', 'salary': 8500, 'department': 'HR'},
+            {'first_name': 'Jim', 'last_name': 'Doe',
+             'email': 'john@test.com', 'salary': 8500, 'department': 'IT'},
+        ]
+        path = self.write('employees.ndjson',
+                          ''.join(json.dumps(row) + '\n' for row in rows))
+        err = io.StringIO()
+        call_command('import_employees', path, stdout=io.StringIO(),
+                     stderr=err)
+
+        self.assertEqual(list(Employee.objects.values_list('email',
+                                                           flat=True)),
+                         ['john@test.com'])
+        self.assertIn('Row 2:', err.getvalue())
+        self.assertIn('Department \\"HR\\" does not exist.',
+                      err.getvalue())
+        self.assertIn('Row 3:', err.getvalue())
+
+    def test_import_row_conflicting_on_revalidation(self):
+        """Test a row turning invalid on the second pass is reported"""
+        rows = [
+            {'first_name': 'Jane', 'last_name': 'Doe',
+             'email': 'jane@test.com', 'salary': 8500, 'department': 'HR'},
+            {'first_name': 'John', 'last_name': 'Smith',
+             'email': 'john@test.com', 'salary': 7500, 'department': 'IT'},
+            {'first_name': 'Mark', 'last_name': 'Brown',
+             'email': 'mark@test.com', 'salary': 6500, 'department': 'IT'},
+        ]
+        path = self.write('employees.ndjson',
+                          ''.join(json.dumps(row) + '\n' for row in rows))
+        email_owners = EmployeeBulkListSerializer._email_owners
+        calls = []
+
+        def insert_concurrently(serializer, items):
+            calls.append(items)
+            if len(calls) == 2:
+                Employee.objects.create(first_name='John', last_name='Smith',
+                                        email='john@test.com', salary=1,
+                                        department=Department.objects.get())
+            return email_owners(serializer, items)
+
+        err = io.StringIO()
+        with mock.patch.object(EmployeeBulkListSerializer, '_email_owners',
+                               insert_concurrently):
+            call_command('import_employees', path, stdout=io.StringIO(),
+                         stderr=err)
+
+        self.assertTrue(Employee.objects.filter(email='mark@test.com')
+                        .exists())
+        self.assertIn('Row 1:', err.getvalue())
+        self.assertIn('Row 2:', err.getvalue())
+
+    def test_resume_from_checkpoint(self):
+        """Test rows recorded in the checkpoint are not imported again"""
+        path = self.write('employees.ndjson', ''.join(
+            json.dumps({'first_name': name, 'last_name': 'Smith',
+                        'email': f'{name}@test.com', 'salary': 7500,
+                        'department': 'IT'}) + '\n'
+            for name in ('john', 'jane', 'mark')
+        ))
+        self.write('employees.ndjson.checkpoint', '2')
+        call_command('import_employees', path, stdout=io.StringIO())
+
+        self.assertEqual(list(Employee.objects.values_list('email',
+                                                           flat=True)),
+                         ['mark@test.com'])
+
+
+class PruneTombstonesCommandTests(TestCase):
+    """Test the prune_tombstones management command"""
+
+    def test_prune_expired(self):
+        """Test only tombstones past the retention are deleted"""
+        Tombstone.objects.create(model='employees.employee', object_id=1)
+        Tombstone.objects.create(
+            model='employees.employee', object_id=2,
+            deleted_at=timezone.now() - datetime.timedelta(days=365)
+        )
+
+        call_command('prune_tombstones', batch_size=1, stdout=io.StringIO())
+
+        self.assertEqual(list(Tombstone.objects.values_list('object_id',
+                                                            flat=True)),
+                         [1])
+
+
+class ReconcileCountsCommandTests(TestCase):
+    """Test the reconcile_counts management command"""
+
+    def test_reconcile_drift(self):
+        """Test counts and names changed by plain updates are repaired"""
+        department = Department.objects.create(name='IT',
+                                               description='IT DEPARTMENT')
+        empty = Department.objects.create(name='HR',
+                                          description='HR DEPARTMENT')
+        employee = Employee.objects.create(first_name='John',
+                                           last_name='Smith',
+                                           email='john@test.com', salary=1,
+                                           department=department)
+        Employee.objects.update(is_manager=True, department_name='')
+        Department.objects.filter(pk=empty.pk).update(employee_count=5)
+
+        out = io.StringIO()
+        call_command('reconcile_counts', batch_size=1, stdout=out)
+
+        department.refresh_from_db()
+        empty.refresh_from_db()
+        employee.refresh_from_db()
+        self.assertEqual((department.employee_count,
+                          department.manager_count), (1, 1))
+        self.assertEqual(empty.employee_count, 0)
+        self.assertEqual(employee.department_name, 'IT')
+        self.assertIn('2 departments', out.getvalue())
+
+
+class SeedBenchCommandTests(TestCase):
+    """Test the seed_bench and bench management commands"""
+
+    def seed(self, **options):
+        call_command('seed_bench', departments=3, employees=25, batch_size=10,
+                     stdout=io.StringIO(), **options)
+        return list(Employee.objects.order_by('email').values_list(
+            'email', 'salary', 'hired_at', 'department__name', 'is_manager'
+        ))
+
+    def test_seed_deterministic(self):
+        """Test the same seed generates the same data"""
+        first = self.seed()
+        second = self.seed(clear=True)
+
+        self.assertEqual(len(first), 25)
+        self.assertEqual(Department.objects.count(), 3)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, self.seed(clear=True, seed=1))
+
+    def test_seed_existing_data(self):
+        """Test seeding twice without clear is refused"""
+        self.seed()
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_bench(self):
+        """Test every scenario is reported and writes are rolled back"""
+        self.seed()
+        cache.clear()
+        token_cache.clear()
+        out = io.StringIO()
+        # throttles would fail the benchmark
+        with mock.patch.dict(TokenBucketThrottle.THROTTLE_RATES,
+                             employees='1/min', departments='1/min'):
+            call_command('bench', requests=3, warmup=1, profile_requests=1,
+                         stdout=out)
+
+        for scenario in ('employees-list', 'employees-detail',
+                         'employees-create', 'employees-update',
+                         'departments-list', 'departments-update'):
+            self.assertIn(scenario, out.getvalue())
+        self.assertEqual(Employee.objects.count(), 25)
+        self.assertEqual(Department.objects.count(), 3)
+        # cached responses and tokens didn't outlive the rollback
+        self.assertEqual(department_cache.stats(), {'hits': 0, 'misses': 0})
+        self.assertEqual(len(token_cache), 0)
+
+
+@override_settings(REQUEST_METRICS={'ENABLED': True,
+                                    'SLOW_REQUEST_QUERIES': 1})
+class RequestMetricsMiddlewareTests(TestCase):
+    """Test the request metrics middleware"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        department = Department.objects.create(name='IT',
+                                               description='IT DEPARTMENT')
+        Employee.objects.create(first_name='John', last_name='Smith',
+                                email='john@test.com', salary=7500,
+                                department=department)
+        request_metrics.clear()
+
+    def tearDown(self):
+        request_metrics.clear()
+
+    def test_server_timing(self):
+        """Test responses get a Server-Timing header"""
+        res = self.client.get(reverse('employees:employee-list'))
+
+        timing = res['Server-Timing']
+        self.assertIn('app;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('serializer;dur=', timing)
+
+    def test_metrics_per_view(self):
+        """Test totals are aggregated per URL name"""
+        url = reverse('employees:employee-list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        view = request_metrics.snapshot()['employees:employee-list']
+        self.assertEqual(view.requests, 2)
+        self.assertEqual(view.queries, 2 * len(queries))
+        self.assertGreater(view.serializer_time, 0)
+        self.assertGreater(view.response_bytes, 0)
+
+        res = self.client.get(METRICS_URL)
+        self.assertIn('http_request_duration_seconds_count'
+                      '{view="employees:employee-list"} 2', res.data)
+        self.assertIn('http_request_db_queries_total'
+                      '{view="employees:employee-list"}', res.data)
+
+    def test_metrics_shared_by_processes(self):
+        """Test the totals of every process sharing the cache are reported"""
+        other = MetricsRegistry()
+        metrics = RequestMetrics()
+        metrics.queries = 3
+        metrics.db_time = 0.002
+
+        request_metrics.observe('view', 0.02, metrics, 100)
+        other.observe('view', 0.2, metrics, 50)
+        other.flush()
+
+        view = request_metrics.snapshot()['view']
+        self.assertEqual(view.requests, 2)
+        self.assertAlmostEqual(view.duration, 0.22)
+        self.assertEqual(view.queries, 6)
+        self.assertAlmostEqual(view.db_time, 0.004)
+        self.assertEqual(view.response_bytes, 150)
+        self.assertEqual(sum(view.buckets), 2)
+
+    def test_metrics_flushed_periodically(self):
+        """Test requests are added to the cache every FLUSH_INTERVAL"""
+        with mock.patch.dict(METRICS_SETTINGS, FLUSH_INTERVAL=0):
+            self.client.get(reverse('employees:employee-list'))
+
+        # read by another process, without this one's totals
+        view = MetricsRegistry().snapshot()['employees:employee-list']
+        self.assertEqual(view.requests, 1)
+
+    def test_slow_request_logged(self):
+        """Test requests above the query threshold are logged"""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('employees:employee-list'))
+
+        self.assertIn('employees:employee-list', logs.output[0])
+
+    @override_settings(REQUEST_METRICS={'ENABLED': False})
+    def test_disabled(self):
+        """Test nothing is recorded unless enabled"""
+        res = self.client.get(reverse('employees:employee-list'))
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(request_metrics.snapshot(), {})
+
+
+class FastJSONTests(TestCase):
+    """Test the orjson backed renderer and parser"""
+
+    data = {
+        'salary': Decimal('7500.50'),
+        'hired_at': datetime.datetime(2020, 1, 1, 12, 30, 15, 123456,
+                                      tzinfo=datetime.timezone.utc),
+        'date': datetime.date(2020, 1, 1),
+        'name': gettext_lazy('Employees'),
+        'text': 'line\u2028separator \u00e9',
+        'nested': [{'id': 1, 'is_manager': True, 'picture': None}],
+        1: 'non string key',
+    }
+
+    def test_render_same_as_json_renderer(self):
+        """Test the output is byte for byte the output of JSONRenderer"""
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data),
+                         JSONRenderer().render(self.data))
+
+    def test_render_without_orjson(self):
+        """Test rendering falls back to JSONRenderer without orjson"""
+        with mock.patch.object(renderers, 'orjson', None):
+            body = renderers.FastJSONRenderer().render(self.data)
+
+        self.assertEqual(body, JSONRenderer().render(self.data))
+
+    def test_render_indent(self):
+        """Test indented output is left to JSONRenderer"""
+        body = renderers.FastJSONRenderer().render(
+            self.data, 'application/json; indent=4'
+        )
+
+        self.assertEqual(body, JSONRenderer().render(
+            self.data, 'application/json; indent=4'
+        ))
+
+    def test_parse(self):
+        """Test JSON is parsed, with or without orjson"""
+        body = '{"salary": "7500.50", "name": "\u00e9"}'.encode()
+        expected = {'salary': '7500.50', 'name': '\u00e9'}
+
+        parser = parsers.FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(body)), expected)
+        with mock.patch.object(parsers, 'orjson', None):
+            self.assertEqual(parser.parse(io.BytesIO(body)), expected)
+
+    def test_parse_error(self):
+        """Test invalid JSON raises a parse error"""
+        with self.assertRaises(ParseError):
+            parsers.FastJSONParser().parse(io.BytesIO(b'{"salary":'))
+
+    def test_api_uses_fast_json(self):
+        """Test API requests and responses use the fast renderer"""
+        user = get_user_model().objects.create_superuser('test_super_user',
+                                                         'password123')
+        client = APIClient()
+        client.force_authenticate(user)
+        department = Department.objects.create(name='IT',
+                                               description='IT DEPARTMENT')
+
+        res = client.post(reverse('employees:employee-list'), {
+            'first_name': 'John', 'last_name': 'Smith',
+            'email': 'john@test.com', 'salary': '7500.50',
+            'department': department.id,
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(res.accepted_renderer,
+                              renderers.FastJSONRenderer)
+        self.assertEqual(json.loads(res.content)['salary'], '7500.50')
+
+
+class FakeConnection:
+    """DB-API connection stand-in"""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    """Test the connection pool"""
+
+    def test_connections_reused(self):
+        """Test released connections are reused"""
+        connect = mock.Mock(side_effect=FakeConnection)
+        pool = ConnectionPool(connect, max_size=2)
+
+        first = pool.acquire()
+        pool.release(first)
+
+        self.assertIs(pool.acquire(), first)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertEqual(connect.call_count, 2)
+        self.assertEqual(pool.size, 2)
+
+    def test_acquire_timeout(self):
+        """Test acquiring fails when every connection stays in use"""
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+        pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+    def test_acquire_waits_for_release(self):
+        """Test acquiring waits for a connection to be released"""
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=5)
+        connection = pool.acquire()
+        threading.Timer(0.05, pool.release, [connection]).start()
+
+        self.assertIs(pool.acquire(), connection)
+
+    def test_health_check(self):
+        """Test idle connections failing the check are replaced"""
+        check = mock.Mock(side_effect=Exception('gone away'))
+        pool = ConnectionPool(FakeConnection, check=check, check_after=0)
+        connection = pool.acquire()
+        pool.release(connection)
+
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_max_lifetime(self):
+        """Test connections past their lifetime are closed on release"""
+        pool = ConnectionPool(FakeConnection, max_lifetime=0)
+        connection = pool.acquire()
+        pool.release(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.size, 0)
+
+
+class PooledDatabaseWrapperTests(TestCase):
+    """Test the pooled database backend against SQLite"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings_dict = {
+            **connection.settings_dict,
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': os.path.join(self.dir.name, 'pool.sqlite3'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {'pool': {'max_size': 1, 'timeout': 0.05}},
+        }
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        self.wrappers[0].close_pool()
+        self.dir.cleanup()
+
+    def wrapper(self):
+        wrapper = DatabaseWrapper(self.settings_dict, alias='pool_test')
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def test_connection_returned_to_pool(self):
+        """Test closing a connection makes it available to others"""
+        first = self.wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = first.connection
+        first.close()
+
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+
+        with self.assertRaises(PoolTimeout):
+            self.wrapper().ensure_connection()
+
+    def test_transaction_rolled_back(self):
+        """Test open transactions are rolled back before reuse"""
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE pooled (id integer)')
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO pooled VALUES (1)')
+        raw = wrapper.connection
+        wrapper.close()
+
+        other = self.wrapper()
+        other.ensure_connection()
+        self.assertIs(other.connection, raw)
+        with other.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM pooled')
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_closed_in_atomic_block(self):
+        """Test connections closed in an atomic block are discarded"""
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.in_atomic_block = True
+        wrapper.close()
+
+        other = self.wrapper()
+        other.ensure_connection()
+        self.assertIsNot(other.connection, raw)
+
+    def test_persistent_connections_refused(self):
+        """Test pooling can't be combined with CONN_MAX_AGE"""
+        self.settings_dict['CONN_MAX_AGE'] = 60
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.wrapper().ensure_connection()
+        self.settings_dict['CONN_MAX_AGE'] = 0
+
+
+class AsyncViewTests(TestCase):
+    """Test list and detail GETs dispatched asynchronously"""
+
+    def setUp(self):
+        token_cache.clear()
+        user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        token = Token.objects.create(user=user)
+        self.client = AsyncClient()
+        self.headers = {'authorization': f'Token {token.key}'}
+        self.department = Department.objects.create(
+            name='IT', description='IT DEPARTMENT'
+        )
+        self.employee = Employee.objects.create(
+            first_name='John', last_name='Smith', email='john@test.com',
+            salary=7500, department=self.department
+        )
+
+    def tearDown(self):
+        token_cache.clear()
+
+    async def test_list_employees(self):
+        """Test listing employees with the async ORM"""
+        res = await self.client.get(reverse('employees:employee-list'),
+                                    headers=self.headers)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([employee['email']
+                          for employee in res.json()['results']],
+                         ['john@test.com'])
+        self.assertIn('ETag', res)
+
+        res = await self.client.get(reverse('employees:employee-list'),
+                                    headers={**self.headers,
+                                             'if-none-match': res['ETag']})
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_retrieve_employee(self):
+        """Test retrieving an employee, or 404 if missing"""
+        res = await self.client.get(
+            reverse('employees:employee-details', args=[self.employee.id]),
+            headers=self.headers
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['department'], 'IT')
+
+        res = await self.client.get(
+            reverse('employees:employee-details',
+                    args=[self.employee.id + 1]),
+            headers=self.headers
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_list_departments(self):
+        """Test listing departments from the cache and with stats"""
+        url = reverse('departments:department-list')
+        res = await self.client.get(url, headers=self.headers)
+        self.assertEqual([department['name']
+                          for department in res.json()['results']], ['IT'])
+
+        res = await self.client.get(url, {'with_stats': '1'},
+                                    headers=self.headers)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['results'][0]['headcount'], 1)
+
+    async def test_retrieve_department(self):
+        """Test retrieving a department"""
+        res = await self.client.get(
+            reverse('departments:department-details',
+                    args=[self.department.id]),
+            headers=self.headers
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['name'], 'IT')
+
+    @override_settings(REQUEST_METRICS={'ENABLED': True})
+    async def test_request_metrics(self):
+        """Test queries of async views are measured"""
+        res = await self.client.get(reverse('employees:employee-list'),
+                                    headers=self.headers)
+
+        self.assertRegex(res['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    async def test_invalid_token(self):
+        """Test an invalid token is rejected"""
+        res = await self.client.get(reverse('employees:employee-list'),
+                                    headers={'authorization': 'Token nope'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_write_dispatched_synchronously(self):
+        """Test other methods are still served by the sync handlers"""
+        res = await self.client.post(
+            reverse('departments:department-list'),
+            {'name': 'HR', 'description': 'HR DEPARTMENT'},
+            content_type='application/json', headers=self.headers
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(ASYNC_QUERY_FANOUT=True)
+class AsyncQueryFanoutTests(TransactionTestCase):
+    """Test queries fanned out to worker threads"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        self.token = Token.objects.create(user=user)
+        department = Department.objects.create(name='IT',
+                                               description='IT DEPARTMENT')
+        Employee.objects.create(first_name='John', last_name='Smith',
+                                email='john@test.com', salary=7500,
+                                department=department)
+
+    def test_run_query_in_worker_thread(self):
+        """Test queries run in a worker thread on a connection of its own"""
+        def count():
+            return (threading.get_ident(), Employee.objects.count())
+
+        ident, count = async_to_sync(run_query)(count)
+
+        self.assertNotEqual(ident, threading.get_ident())
+        self.assertEqual(count, 1)
+
+    def test_list_employees(self):
+        """Test the list and its validators are fetched concurrently"""
+        client = AsyncClient()
+        headers = {'authorization': f'Token {self.token.key}'}
+        url = reverse('employees:employee-list')
+
+        res = async_to_sync(client.get)(url, headers=headers)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()['results']), 1)
+
+        res = async_to_sync(client.get)(
+            url, headers={**headers, 'if-none-match': res['ETag']}
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class EventStreamConnectionTests(TransactionTestCase):
+    """Test event streams don't hold database connections"""
+
+    def setUp(self):
+        token_cache.clear()
+        user = get_user_model().objects.create_superuser('test_super_user',
+                                                         'password123')
+        self.token = Token.objects.create(user=user)
+        self.default = connections['default']
+        self.pooled = DatabaseWrapper({
+            **self.default.settings_dict,
+            'ENGINE': 'core.db.backends.sqlite3',
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {'pool': {'max_size': 2}},
+        }, alias='default')
+        # SQLite doesn't close in-memory test databases, the original
+        # connection keeps this one alive
+        self.pooled.is_in_memory_db = lambda: False
+        # the request's sync code runs in this thread, see async_to_sync()
+        connections['default'] = self.pooled
+
+    def tearDown(self):
+        self.pooled.close()
+        self.pooled.close_pool()
+        connections['default'] = self.default
+        token_cache.clear()
+
+    def test_connections_released_while_streaming(self):
+        """Test the request's pooled connection is returned once streaming"""
+        client = AsyncClient()
+        headers = {'authorization': f'Token {self.token.key}'}
+
+        async def stream():
+            res = await client.get(EVENTS_URL, headers=headers)
+            await anext(aiter(res.streaming_content))
+            return res
+
+        res = async_to_sync(stream)()
+        try:
+            self.assertEqual(self.pooled.pool.size, 1)
+            self.assertEqual(self.pooled.pool.in_use, 0)
+        finally:
+            res.close()
+
+
+class LocalBackendTests(TestCase):
+    """Test the in-process event broker backend"""
+
+    def setUp(self):
+        self.backend = LocalBackend()
+
+    async def test_publish_from_thread(self):
+        """Test events published from another thread are delivered"""
+        subscription = self.backend.subscribe(['employees'])
+        other = self.backend.subscribe(['departments'])
+
+        await sync_to_async(self.backend.publish, thread_sensitive=False)(
+            'employees', {'event': 'employee.created'})
+
+        self.assertEqual(await asyncio.wait_for(subscription.get(), 1),
+                         {'event': 'employee.created'})
+        self.assertTrue(other.queue.empty())
+
+    async def test_overflow(self):
+        """Test a subscriber falling behind gets OVERFLOW only"""
+        subscription = self.backend.subscribe(['employees'])
+
+        with mock.patch.dict(EVENTS_SETTINGS, QUEUE_SIZE=2):
+            subscription = self.backend.subscribe(['employees'])
+        for i in range(3):
+            self.backend.publish('employees', {'event': i})
+        await asyncio.sleep(0)
+
+        self.assertIs(await subscription.get(), OVERFLOW)
+        self.assertTrue(subscription.queue.empty())
+
+    async def test_close(self):
+        """Test closed subscriptions are forgotten"""
+        subscription = self.backend.subscribe(['employees', 'departments'])
+        self.assertEqual(self.backend.subscriber_count(), 1)
+
+        subscription.close()
+
+        self.assertEqual(self.backend.subscriber_count(), 0)
+
+
+@mock.patch.dict(EVENTS_SETTINGS, POLL_INTERVAL=0.01)
+class CacheBackendTests(TestCase):
+    """Test the event broker backend shared through the Django cache"""
+
+    def setUp(self):
+        cache.clear()
+        # two processes sharing the cache
+        self.backend, self.other = CacheBackend(), CacheBackend()
+
+    def tearDown(self):
+        cache.clear()
+
+    async def test_publish_from_other_process(self):
+        """Test events published by another process are delivered"""
+        subscription = self.backend.subscribe(['employees'])
+        other = self.backend.subscribe(['departments'])
+
+        await sync_to_async(self.other.publish, thread_sensitive=False)(
+            'employees', {'event': 'employee.created'})
+
+        self.assertEqual(await asyncio.wait_for(subscription.get(), 1),
+                         {'event': 'employee.created'})
+        self.assertTrue(other.queue.empty())
+        subscription.close()
+        other.close()
+
+    @mock.patch.dict(EVENTS_SETTINGS, RETENTION=0)
+    async def test_expired_events_overflow(self):
+        """Test subscribers missing expired events get OVERFLOW"""
+        subscription = self.backend.subscribe(['employees'])
+
+        await sync_to_async(self.other.publish)('employees', {'event': 1})
+        await sync_to_async(cache.delete)('events:1')
+
+        self.assertIs(await asyncio.wait_for(subscription.get(), 1),
+                      OVERFLOW)
+        subscription.close()
+
+    async def test_pending_event_delivered(self):
+        """Test events stored after the sequence is incremented arrive"""
+        subscription = self.backend.subscribe(['employees'])
+
+        await sync_to_async(cache.set)('events:sequence', 1, None)
+        await asyncio.sleep(0.05)
+        await sync_to_async(cache.set)('events:1', ('employees', {'id': 1}))
+
+        self.assertEqual(await asyncio.wait_for(subscription.get(), 1),
+                         {'id': 1})
+        subscription.close()
+
+    async def test_overflow_per_subscriber(self):
+        """Test only the subscribers falling behind get OVERFLOW"""
+        with mock.patch.dict(EVENTS_SETTINGS, QUEUE_SIZE=2):
+            subscription = self.backend.subscribe(['employees'])
+            other = self.backend.subscribe(['departments'])
+
+            def publish():
+                for i in range(3):
+                    self.other.publish('departments', {'id': i})
+                self.other.publish('employees', {'id': 1})
+            await sync_to_async(publish)()
+
+            self.assertEqual(await asyncio.wait_for(subscription.get(), 1),
+                             {'id': 1})
+            self.assertIs(await asyncio.wait_for(other.get(), 1), OVERFLOW)
+        subscription.close()
+        other.close()
+
+
+class EventStreamViewTests(TestCase):
+    """Test the Server-Sent Events API"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = AsyncClient()
+        self.headers = {'authorization': f'Token {token.key}'}
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def create_department(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Department.objects.create(name='IT',
+                                             description='IT DEPARTMENT')
+
+    async def test_stream_changes(self):
+        """Test changes are pushed to subscribers"""
+        res = await self.client.get(EVENTS_URL, headers=self.headers)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'],
+                         'text/event-stream; charset=utf-8')
+        stream = aiter(res.streaming_content)
+        self.assertEqual(await anext(stream), b': connected\n\n')
+
+        department = await sync_to_async(self.create_department)()
+        self.assertEqual(
+            await asyncio.wait_for(anext(stream), 1),
+            b'event: department.created\n'
+            b'data: {"ids":[%d]}\n\n' % department.id
+        )
+
+        # as servers do once the client is gone
+        res.close()
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    @mock.patch.dict(EVENTS_SETTINGS, HEARTBEAT=0.01)
+    async def test_heartbeat(self):
+        """Test idle streams send heartbeat comments"""
+        res = await self.client.get(EVENTS_URL, {'channels': 'employees'},
+                                    headers=self.headers)
+        stream = aiter(res.streaming_content)
+        await anext(stream)
+
+        self.assertEqual(await anext(stream), b': heartbeat\n\n')
+        res.close()
+
+    async def test_unknown_channel(self):
+        """Test subscribing to an unknown channel fails"""
+        res = await self.client.get(EVENTS_URL, {'channels': 'users'},
+                                    headers=self.headers)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(res.content.startswith(b'event: error\n'))
+
+    def test_asgi_required(self):
+        """Test streams are refused by the WSGI application"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(EVENTS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_501_NOT_IMPLEMENTED)
@@ -0,0 +1,179 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache import LRUCache
+
+THROTTLE_SETTINGS = {
+    'BACKEND': 'core.throttling.LocalBucketBackend',
+    'MAX_SIZE': 10000,
+    'DJANGO_CACHE': 'default',
+    **getattr(settings, 'THROTTLE', {}),
+}
+
+
+class BaseBucketBackend:
+    """Interface of token bucket stores
+
+    A bucket is the pair (tokens, time of the last refill), so its state
+    is constant in size whatever the rate.
+    """
+
+    def consume(self, key, capacity, rate):
+        """Take a token from the bucket of key
+
+        Return 0 if a token was taken, else the seconds until one is
+        available. The bucket holds at most capacity tokens and refills at
+        rate tokens per second.
+        """
+        raise NotImplementedError
+
+    def take(self, bucket, now, capacity, rate):
+        """Return the bucket after taking a token at now, and the wait"""
+        tokens, updated = bucket or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens < 1:
+            return (tokens, now), (1 - tokens) / rate
+        return (tokens - 1, now), 0
+
+    def get_timeout(self, capacity, rate):
+        """Return the seconds after which an idle bucket is full again"""
+        return capacity / rate
+
+
+class LocalBucketBackend(BaseBucketBackend):
+    """Buckets in an in-process LRU, limiting each worker separately"""
+
+    def __init__(self):
+        self.buckets = LRUCache(max_size=THROTTLE_SETTINGS['MAX_SIZE'])
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        with self._lock:
+            bucket, wait = self.take(self.buckets.get(key), time.monotonic(),
+                                     capacity, rate)
+            self.buckets.set(key, bucket, self.get_timeout(capacity, rate))
+        return wait
+
+    def clear(self):
+        """Forget every bucket"""
+        self.buckets.clear()
+
+
+class CacheBucketBackend(BaseBucketBackend):
+    """Buckets in the Django cache named by `THROTTLE['DJANGO_CACHE']`
+
+    Workers sharing the cache share the limits. With Django's Redis cache,
+    a bucket is updated by a Lua script, atomically and in one round trip,
+    on the clock of Redis. Other caches update it under a lock taken with
+    `cache.add()` and released by its owner only, so a burst of concurrent
+    requests can't all take the same token.
+    """
+    lock_timeout = 1
+    retry_delay = 0.002
+    # same as BaseBucketBackend.take(), returning the wait as a string as
+    # Lua numbers are truncated to integers in replies
+    script = """
+        local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local clock = redis.call('TIME')
+        local now = clock[1] + clock[2] / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+        local wait = 0
+        if tokens < 1 then
+            wait = (1 - tokens) / rate
+        else
+            tokens = tokens - 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens),
+                   'updated', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+        return tostring(wait)
+    """
+
+    @property
+    def cache(self):
+        return caches[THROTTLE_SETTINGS['DJANGO_CACHE']]
+
+    def consume(self, key, capacity, rate):
+        key = f'throttle:{key}'
+        if isinstance(self.cache, RedisCache):
+            return self.consume_script(key, capacity, rate)
+        return self.consume_locked(key, capacity, rate)
+
+    def consume_script(self, key, capacity, rate):
+        """Take a token with the Lua script, on a Redis cache"""
+        key = self.cache.make_and_validate_key(key)
+        client = self.cache._cache.get_client(key, write=True)
+        script = client.register_script(self.script)
+        return float(script(keys=[key], args=[capacity, rate]))
+
+    def consume_locked(self, key, capacity, rate):
+        """Take a token under a lock, on any cache"""
+        lock = f'{key}:lock'
+        owner = uuid.uuid4().hex
+        # the lock expires, so a crashed holder can't block the bucket
+        while not self.cache.add(lock, owner, self.lock_timeout):
+            time.sleep(self.retry_delay)
+        try:
+            bucket, wait = self.take(self.cache.get(key), time.time(),
+                                     capacity, rate)
+            self.cache.set(key, bucket, self.get_timeout(capacity, rate))
+        finally:
+            # unless it expired and was taken by another worker meanwhile
+            if self.cache.get(lock) == owner:
+                self.cache.delete(lock)
+        return wait
+
+
+buckets = SimpleLazyObject(
+    lambda: import_string(THROTTLE_SETTINGS['BACKEND'])()
+)
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Throttle views by their `throttle_scope` with a token bucket
+
+    The rate of the scope in `DEFAULT_THROTTLE_RATES`, like `100/min`, is
+    both the burst size and the refill rate. Requests are limited per user,
+    or per client address when anonymous. Views without a scope, or whose
+    scope has no rate, aren't throttled.
+    """
+
+    def __init__(self):
+        # the rate depends on the view, see allow_request()
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scope', None)
+        if not self.scope:
+            return True
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.wait_time = buckets.consume(self.get_cache_key(request, view),
+                                         self.num_requests,
+                                         self.num_requests / self.duration)
+        return not self.wait_time
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'{self.scope}:{ident}'
+
+    def wait(self):
+        return self.wait_time
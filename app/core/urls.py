@@ -4,6 +4,8 @@ from drf_yasg import openapi
 
 from django.urls import path
 
+from . import views
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Employees Management API",
@@ -16,4 +18,6 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('', schema_view.with_ui('swagger', cache_timeout=0),
          name='schema-swagger'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+    path('api/events', views.EventStreamView.as_view(), name='events'),
 ]
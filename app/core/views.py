@@ -0,0 +1,133 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import StreamingHttpResponse
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .authentication import CachedTokenAuthentication
+from .cache import response_caches
+from .events import EventStream, broker
+from .metrics import DURATION_BUCKETS, request_metrics
+from .mixins import AsyncAPIViewMixin
+from .renderers import EventStreamRenderer, PlainTextRenderer
+
+
+class StreamingUnavailable(APIException):
+    """Event streams need the ASGI application"""
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Event streams are only served over ASGI.'
+    default_code = 'streaming_unavailable'
+
+
+def response_cache_metrics():
+    """Return response cache counters in Prometheus text format"""
+    lines = []
+    for counter in ('hits', 'misses'):
+        name = f'response_cache_{counter}_total'
+        lines.append(f'# HELP {name} Response cache {counter}')
+        lines.append(f'# TYPE {name} counter')
+        for namespace, cache in sorted(response_caches.items()):
+            value = cache.stats()[counter]
+            lines.append(f'{name}{{namespace="{namespace}"}} {value}')
+    return lines
+
+
+def request_metrics_lines():
+    """Return per view request metrics in Prometheus text format"""
+    views = sorted(request_metrics.snapshot().items())
+    lines = [
+        '# HELP http_request_duration_seconds Request wall time',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for name, view in views:
+        count = 0
+        for bound, bucket in zip(DURATION_BUCKETS, view.buckets):
+            count += bucket
+            lines.append(f'http_request_duration_seconds_bucket'
+                         f'{{view="{name}",le="{bound}"}} {count}')
+        lines.append(f'http_request_duration_seconds_bucket'
+                     f'{{view="{name}",le="+Inf"}} {view.requests}')
+        lines.append(f'http_request_duration_seconds_sum'
+                     f'{{view="{name}"}} {view.duration}')
+        lines.append(f'http_request_duration_seconds_count'
+                     f'{{view="{name}"}} {view.requests}')
+
+    for metric, attr, help_text in (
+        ('http_request_db_queries_total', 'queries', 'Database queries'),
+        ('http_request_db_seconds_total', 'db_time', 'Database time'),
+        ('http_request_serializer_seconds_total', 'serializer_time',
+         'Serializer time'),
+        ('http_response_bytes_total', 'response_bytes',
+         'Response body size, excluding streamed responses'),
+    ):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for name, view in views:
+            value = getattr(view, attr)
+            lines.append(f'{metric}{{view="{name}"}} {value}')
+    return lines
+
+
+class MetricsView(APIView):
+    """API view exposing metrics in Prometheus text format"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        """Return metrics"""
+        lines = response_cache_metrics() + request_metrics_lines()
+        return Response('\n'.join(lines) + '\n')
+
+
+class EventStreamView(AsyncAPIViewMixin, APIView):
+    """API view pushing employee and department changes as Server-Sent Events
+
+    Each event names the change, e.g. `employee.updated`, and carries the
+    ids of the changed objects. Department headcounts change with employee
+    events only. A client falling behind gets an `overflow`
+    event and is disconnected, and should then catch up from the change
+    feeds.
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (EventStreamRenderer,)
+    channels = ('employees', 'departments')
+
+    async def aget(self, request):
+        """Stream the events of `?channels=`, by default of all channels"""
+        if not isinstance(request._request, ASGIRequest):
+            # a synchronous worker would be held by the stream forever
+            raise StreamingUnavailable()
+
+        channels = request.query_params.get('channels')
+        channels = channels.split(',') if channels else self.channels
+        unknown = set(channels) - set(self.channels)
+        if unknown:
+            raise ValidationError({'channels': [
+                f'Unknown channels: {", ".join(sorted(unknown))}.'
+            ]})
+
+        # connections are otherwise released when the stream ends
+        await sync_to_async(self.release_connections)()
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            EventStream(broker.subscribe(channels), renderer),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # ask nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def release_connections(self):
+        """Close the database connections of the request's thread"""
+        for connection in connections.all(initialized_only=True):
+            if not connection.in_atomic_block:
+                connection.close()
@@ -0,0 +1,3 @@
+from core.cache import VersionedCache
+
+department_cache = VersionedCache('departments')
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0002_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='department',
+            index=models.Index(fields=['updated_at', 'id'], name='department_updated_at_id_idx'),
+        ),
+    ]
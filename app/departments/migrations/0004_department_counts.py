@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0003_updated_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='employee_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='department',
+            name='manager_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,14 +1,124 @@
-from django.db import models
+import contextlib
+import threading
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Avg, F, Max, Min, Sum
+from django.utils import timezone
+
+from core.events import publish_change
+
+
+COUNT_FIELDS = ('employee_count', 'manager_count')
+
+# count deltas collected by batch_counts(), per thread
+_batched = threading.local()
 
 # Create your models here.
 
 
+@contextlib.contextmanager
+def batch_counts():
+    """Apply the count changes made in the block once, when it exits"""
+    if getattr(_batched, 'deltas', None) is not None:
+        yield
+        return
+
+    _batched.deltas = deltas = Counter()
+    try:
+        yield
+    finally:
+        _batched.deltas = None
+    Department.objects.adjust_counts(
+        {key: value for key, value in deltas.items() if value}
+    )
+
+
+class DepartmentQuerySet(models.QuerySet):
+    """Queryset for Department objects"""
+
+    def with_stats(self):
+        """Annotate salary aggregates in one GROUP BY
+
+        Headcounts are read from the denormalized count columns.
+        """
+        salary = models.DecimalField(max_digits=20, decimal_places=2)
+        return self.annotate(
+            total_salary=Sum('employee__salary', output_field=salary),
+            avg_salary=Avg('employee__salary', output_field=salary),
+            min_salary=Min('employee__salary', output_field=salary),
+            max_salary=Max('employee__salary', output_field=salary),
+        )
+
+    def adjust_counts(self, deltas):
+        """Add count deltas, mapped by (department id, field name)
+
+        Each department is changed with one UPDATE. Counts are only
+        serialized by the uncached stats, so `updated_at` and the response
+        cache are left alone.
+        """
+        pending = getattr(_batched, 'deltas', None)
+        if pending is not None:
+            pending.update(deltas)
+            return
+
+        changes = {}
+        for (department_id, field), delta in deltas.items():
+            if delta:
+                changes.setdefault(department_id, {})[field] = \
+                    F(field) + delta
+        if not changes:
+            return
+
+        # no event, subscribers learn of counts from employee events
+        with transaction.atomic(using=self.db):
+            for department_id, fields in sorted(changes.items()):
+                self.filter(pk=department_id).update(**fields)
+
+
 class Department(models.Model):
     """department model"""
     name = models.CharField(max_length=255)
     description = models.TextField(max_length=500)
+    # maintained by Employee saves and deletes, see reconcile_counts
+    employee_count = models.PositiveIntegerField(default=0, editable=False)
+    manager_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DepartmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='department_created_at_id_idx'),
+            models.Index(fields=['updated_at', 'id'],
+                         name='department_updated_at_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        """Save, copying a new name to the employees of the department
+
+        Counts are left out of updates, as the copy in memory may be stale.
+        """
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNT_FIELDS
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            renamed = list(self.employee_set
+                           .exclude(department_name=self.name)
+                           .values_list('pk', flat=True))
+            if renamed:
+                self.employee_set.filter(pk__in=renamed).update(
+                    department_name=self.name, updated_at=timezone.now()
+                )
+                publish_change('employees', 'employee.updated', renamed)
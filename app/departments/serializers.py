@@ -1,12 +1,32 @@
 from rest_framework import serializers
 
+from core.serializers import DynamicFieldsMixin
+
 from .models import Department
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Department objects"""
 
     class Meta:
         model = Department
-        fields = '__all__'
+        # the counts are internal, stats exposes them as headcount
+        exclude = ('employee_count', 'manager_count')
         read_only_fields = ('id', 'created_at', 'updated_at')
+
+
+class DepartmentStatsSerializer(DepartmentSerializer):
+    """Serializer for Department objects with employee statistics"""
+    headcount = serializers.IntegerField(source='employee_count',
+                                         read_only=True)
+    total_salary = serializers.DecimalField(max_digits=None,
+                                            decimal_places=2, read_only=True)
+    avg_salary = serializers.DecimalField(max_digits=None,
+                                          decimal_places=2, read_only=True)
+    min_salary = serializers.DecimalField(max_digits=None,
+                                          decimal_places=2, read_only=True)
+    max_salary = serializers.DecimalField(max_digits=None,
+                                          decimal_places=2, read_only=True)
+
+    class Meta(DepartmentSerializer.Meta):
+        exclude = ('employee_count',)
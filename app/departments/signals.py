@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.events import publish_change
+from core.models import Tombstone
+
+from .cache import department_cache
+from .models import Department
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_department_cache(sender, instance, **kwargs):
+    """Invalidate cached department responses once the change commits
+
+    Bumping earlier would let a concurrent request cache the old rows
+    under the new version.
+    """
+    transaction.on_commit(department_cache.bump)
+
+
+@receiver(post_delete, sender=Department)
+def record_department_deletion(sender, instance, **kwargs):
+    """Record a tombstone for the change feed"""
+    Tombstone.record(instance)
+
+
+@receiver(post_save, sender=Department)
+def publish_department_save(sender, instance, created, **kwargs):
+    """Publish the change to event stream subscribers"""
+    publish_change('departments',
+                   'department.created' if created else 'department.updated',
+                   [instance.pk])
+
+
+@receiver(post_delete, sender=Department)
+def publish_department_deletion(sender, instance, **kwargs):
+    """Publish the deletion to event stream subscribers"""
+    publish_change('departments', 'department.deleted', [instance.pk])
@@ -1,16 +1,25 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import TestCase
 
+from unittest import mock
+
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from .models import Department
+from core.changes import CHANGE_FEED_SETTINGS
+from employees.models import Employee
+
+from .cache import department_cache
+from .models import Department, batch_counts
 
 from .serializers import DepartmentSerializer
 
 
 DEPARTMENTS_URL = reverse('departments:department-list')
+STATS_URL = reverse('departments:department-stats')
+CHANGES_URL = reverse('departments:department-changes')
 
 
 def detail_url(department_id):
@@ -23,6 +32,14 @@ def sample_department(name='TEST', description='TEST DEPARTMENT'):
     return Department.objects.create(name=name, description=description)
 
 
+def sample_employee(email, salary, department, is_manager=False):
+    """Create and return a sample employee"""
+    return Employee.objects.create(first_name='John', last_name='Smith',
+                                   email=email, salary=salary,
+                                   department=department,
+                                   is_manager=is_manager)
+
+
 class PublicDepartmentsApiTests(TestCase):
     """Test the publicly available departments API"""
 
@@ -40,6 +57,7 @@ class PrivateDepartmentsApiTests(TestCase):
     """Test the authorized user departments API"""
 
     def setUp(self):
+        cache.clear()
         self.normal_user = get_user_model().objects.create_user(
             'test_normal_user',
             'password123'
@@ -70,10 +88,47 @@ class PrivateDepartmentsApiTests(TestCase):
         departments = Department.objects.all()
         serializer = DepartmentSerializer(departments, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
-        self.assertEqual(len(res.data), 2)
-        self.assertEqual(res.data[1]['name'], 'HR')
-        self.assertEqual(res.data[1]['description'], 'HR DEPARTMENT')
+        results = res.data['results']
+        self.assertEqual(results, serializer.data)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[1]['name'], 'HR')
+        self.assertEqual(results[1]['description'], 'HR DEPARTMENT')
+
+    def test_retrieve_departments_stats(self):
+        """Test retrieving departments statistics in one query"""
+        it = sample_department('IT', 'IT DEPARTMENT')
+        sample_department('HR', 'HR DEPARTMENT')
+        sample_employee('john@test.com', '7500.00', it)
+        sample_employee('jane@test.com', '9000.00', it, True)
+        sample_employee('adam@test.com', '4500.50', it, True)
+
+        with self.assertNumQueries(1):
+            res = self.super_client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        it_stats, hr_stats = res.data['results']
+        self.assertEqual(it_stats['headcount'], 3)
+        self.assertEqual(it_stats['manager_count'], 2)
+        self.assertEqual(it_stats['total_salary'], '21000.50')
+        self.assertEqual(it_stats['avg_salary'], '7000.17')
+        self.assertEqual(it_stats['min_salary'], '4500.50')
+        self.assertEqual(it_stats['max_salary'], '9000.00')
+        self.assertEqual(hr_stats['headcount'], 0)
+        self.assertIsNone(hr_stats['total_salary'])
+
+    def test_retrieve_departments_with_stats(self):
+        """Test departments list includes fresh statistics on request"""
+        it = sample_department('IT', 'IT DEPARTMENT')
+        self.super_client.get(DEPARTMENTS_URL, {'with_stats': 1})
+        sample_employee('john@test.com', '7500.00', it)
+
+        res = self.super_client.get(DEPARTMENTS_URL, {'with_stats': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['headcount'], 1)
+        self.assertNotIn('headcount',
+                         self.super_client.get(DEPARTMENTS_URL)
+                         .data['results'][0])
 
     def test_create_department_successful(self):
         """Test creating a new department"""
@@ -105,6 +160,83 @@ class PrivateDepartmentsApiTests(TestCase):
         self.assertEqual(res.data['name'], department.name)
         self.assertEqual(res.data['description'], department.description)
 
+    def test_department_details_not_modified(self):
+        """Test department details honour ETag and Last-Modified"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        url = detail_url(department.id)
+
+        res = self.super_client.get(url)
+        last_modified = res['Last-Modified']
+
+        res = self.super_client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.super_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_departments_not_modified(self):
+        """Test departments list is answered with 304 until it changes"""
+        sample_department('IT', 'IT DEPARTMENT')
+
+        etag = self.super_client.get(DEPARTMENTS_URL)['ETag']
+        res = self.super_client.get(DEPARTMENTS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_department('HR', 'HR DEPARTMENT')
+        res = self.super_client.get(DEPARTMENTS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_retrieve_departments_cached(self):
+        """Test departments list is served from cache until a write"""
+        sample_department('IT', 'IT DEPARTMENT')
+        self.super_client.get(DEPARTMENTS_URL)
+
+        with self.assertNumQueries(0):
+            res = self.super_client.get(DEPARTMENTS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_department('HR', 'HR DEPARTMENT')
+            # invalidated only once the write commits
+            with self.assertNumQueries(0):
+                res = self.super_client.get(DEPARTMENTS_URL)
+            self.assertEqual(len(res.data['results']), 1)
+
+        res = self.super_client.get(DEPARTMENTS_URL)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_department_details_cache_invalidated(self):
+        """Test cached department details are invalidated on update"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        url = detail_url(department.id)
+        etag = self.super_client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.super_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.super_client.patch(url, {'name': 'NEW IT'})
+        res = self.super_client.get(url)
+        self.assertEqual(res.data['name'], 'NEW IT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.super_client.delete(url)
+        res = self.super_client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_department_details_sparse_fields(self):
+        """Test selecting department fields"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+
+        res = self.super_client.get(detail_url(department.id),
+                                    {'fields': 'id,name'})
+
+        self.assertEqual(res.data, {'id': department.id, 'name': 'IT'})
+
     def test_department_details_patched(self):
         """Test department details can be patched"""
         department = sample_department('IT', 'IT DEPARTMENT')
@@ -155,3 +287,148 @@ class PrivateDepartmentsApiTests(TestCase):
         res = self.super_client.get(url)
 
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class DepartmentCountsTests(TestCase):
+    """Test the denormalized department counts and names"""
+
+    def setUp(self):
+        self.it = sample_department('IT', 'IT DEPARTMENT')
+        self.hr = sample_department('HR', 'HR DEPARTMENT')
+
+    def assertCounts(self, department, employee_count, manager_count):
+        department.refresh_from_db()
+        self.assertEqual((department.employee_count, department.manager_count),
+                         (employee_count, manager_count))
+
+    def test_counts_follow_employees(self):
+        """Test creating, moving, promoting and deleting employees"""
+        employee = sample_employee('john@test.com', 7500, self.it)
+        sample_employee('jane@test.com', 7500, self.it, is_manager=True)
+        self.assertCounts(self.it, 2, 1)
+
+        employee.department = self.hr
+        employee.is_manager = True
+        employee.save()
+        self.assertCounts(self.it, 1, 1)
+        self.assertCounts(self.hr, 1, 1)
+        self.assertEqual(employee.department_name, 'HR')
+
+        Employee.objects.get(pk=employee.pk).delete()
+        self.assertCounts(self.hr, 0, 0)
+
+    def test_counts_follow_stale_copies(self):
+        """Test moving a stale copy of an employee counts its stored move"""
+        employee = sample_employee('john@test.com', 7500, self.it)
+        stale = Employee.objects.get(pk=employee.pk)
+        sales = sample_department('Sales', 'SALES DEPARTMENT')
+
+        employee.department = self.hr
+        employee.save()
+        stale.department = sales
+        stale.save()
+
+        self.assertCounts(self.it, 0, 0)
+        self.assertCounts(self.hr, 0, 0)
+        self.assertCounts(sales, 1, 0)
+
+    def test_counts_leave_version_alone(self):
+        """Test count changes don't version the department representation"""
+        updated_at = self.it.updated_at
+        version = department_cache.version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_employee('john@test.com', 7500, self.it)
+
+        self.assertCounts(self.it, 1, 0)
+        self.assertEqual(self.it.updated_at, updated_at)
+        self.assertEqual(department_cache.version(), version)
+
+    def test_counts_follow_bulk_operations(self):
+        """Test bulk creating, updating and deleting employees"""
+        employees = Employee.objects.bulk_create([
+            Employee(first_name='John', last_name='Smith', salary=7500,
+                     email=f'john{i}@test.com', department=self.it)
+            for i in range(3)
+        ])
+        self.assertCounts(self.it, 3, 0)
+        self.assertEqual(employees[0].department_name, 'IT')
+
+        employees[0].department = self.hr
+        employees[1].is_manager = True
+        Employee.objects.bulk_update(employees, ['department', 'is_manager'])
+        self.assertCounts(self.it, 2, 1)
+        self.assertCounts(self.hr, 1, 0)
+        self.assertEqual(Employee.objects.get(pk=employees[0].pk)
+                         .department_name, 'HR')
+
+        with batch_counts(), self.assertNumQueries(4):
+            Employee.objects.filter(department=self.it).delete()
+        self.assertCounts(self.it, 0, 0)
+
+    def test_rename_propagates(self):
+        """Test renaming a department renames it on its employees"""
+        employee = sample_employee('john@test.com', 7500, self.it)
+
+        self.it.name = 'IT & Data'
+        self.it.save()
+
+        employee.refresh_from_db()
+        self.assertEqual(employee.department_name, 'IT & Data')
+        self.assertGreaterEqual(employee.updated_at, self.it.updated_at)
+
+    def test_denormalized_changes_published(self):
+        """Test name updates are sent to event streams, counts aren't"""
+        with mock.patch('core.events.broker') as broker, \
+                self.captureOnCommitCallbacks(execute=True):
+            employee = sample_employee('john@test.com', 7500, self.it)
+        broker.publish.assert_called_once_with('employees', {
+            'event': 'employee.created', 'data': {'ids': [employee.pk]}
+        })
+
+        with mock.patch('core.events.broker') as broker, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.it.name = 'IT & Data'
+            self.it.save()
+        broker.publish.assert_any_call('employees', {
+            'event': 'employee.updated', 'data': {'ids': [employee.pk]}
+        })
+
+    def test_counts_not_serialized(self):
+        """Test counts are only exposed by the stats as headcount"""
+        self.assertNotIn('employee_count', DepartmentSerializer(self.it).data)
+
+
+@mock.patch.dict(CHANGE_FEED_SETTINGS, LAG=0)
+class DepartmentChangesApiTests(TestCase):
+    """Test the departments change feed API"""
+
+    def setUp(self):
+        self.super_user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        self.super_client = APIClient()
+        self.super_client.force_authenticate(self.super_user)
+
+    def test_changes_since_cursor(self):
+        """Test created, updated and deleted departments are listed"""
+        it = sample_department('IT', 'IT DEPARTMENT')
+        hr = sample_department('HR', 'HR DEPARTMENT')
+
+        res = self.super_client.get(CHANGES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['upserts'],
+                         DepartmentSerializer([it, hr], many=True).data)
+
+        it.name = 'IT & Data'
+        it.save()
+        hr_id = hr.id
+        hr.delete()
+
+        res = self.super_client.get(CHANGES_URL,
+                                    {'since': res.data['cursor']})
+        self.assertEqual([department['name']
+                          for department in res.data['upserts']],
+                         ['IT & Data'])
+        self.assertEqual(res.data['deletes'], [hr_id])
@@ -7,6 +7,10 @@ app_name = 'departments'
 urlpatterns = [
     path('', views.DepartmentListCreateAPIView.as_view(),
          name='department-list'),
+    path('changes', views.DepartmentChangesAPIView.as_view(),
+         name='department-changes'),
+    path('stats', views.DepartmentStatsAPIView.as_view(),
+         name='department-stats'),
     path('<pk>', views.DepartmentDetailsAPIView.as_view(),
          name='department-details'),
 ]
@@ -1,23 +1,88 @@
-from rest_framework.generics import ListCreateAPIView,\
+from rest_framework.generics import ListAPIView, ListCreateAPIView,\
     RetrieveUpdateDestroyAPIView
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.mixins import ListModelMixin
 from rest_framework.permissions import IsAdminUser
 
+from core.authentication import CachedTokenAuthentication
+from core.changes import ChangeFeedAPIView
+from core.mixins import AsyncListMixin, AsyncRetrieveMixin, \
+    CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin
+
+from .cache import department_cache
 from .models import Department
-from .serializers import DepartmentSerializer
+from .serializers import DepartmentSerializer, DepartmentStatsSerializer
 
 
-class DepartmentListCreateAPIView(ListCreateAPIView):
+class DepartmentListCreateAPIView(CachedResponseMixin, ConditionalGetMixin,
+                                  SparseFieldsMixin, AsyncListMixin,
+                                  ListCreateAPIView):
     """API view to retrieve list of departments or create new"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAdminUser,)
+    throttle_scope = 'departments'
     serializer_class = DepartmentSerializer
     queryset = Department.objects.all()
+    response_cache = department_cache
+
+    def with_stats(self):
+        """Return whether employee statistics were requested"""
+        return self.request.method == 'GET' and \
+            self.request.query_params.get('with_stats') in ('1', 'true')
+
+    def get_queryset(self):
+        """Return departments, annotated with statistics if requested"""
+        queryset = super().get_queryset()
+        if self.with_stats():
+            return queryset.with_stats()
+
+        return queryset
+
+    def get_serializer_class(self):
+        """Return appropriate serializer class"""
+        if self.with_stats():
+            return DepartmentStatsSerializer
+
+        return DepartmentSerializer
+
+    def list(self, request, *args, **kwargs):
+        """List departments, skipping cache and validators for stats"""
+        if self.with_stats():
+            # statistics change with employees, which don't version this list
+            return ListModelMixin.list(self, request, *args, **kwargs)
+
+        return super().list(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        """List departments, skipping cache and validators for stats"""
+        if self.with_stats():
+            return await AsyncListMixin.alist(self, request, *args, **kwargs)
 
+        return await super().alist(request, *args, **kwargs)
 
-class DepartmentDetailsAPIView(RetrieveUpdateDestroyAPIView):
+
+class DepartmentDetailsAPIView(CachedResponseMixin, ConditionalGetMixin,
+                               SparseFieldsMixin, AsyncRetrieveMixin,
+                               RetrieveUpdateDestroyAPIView):
     """API view to retrieve, update or delete department"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    throttle_scope = 'departments'
+    serializer_class = DepartmentSerializer
+    queryset = Department.objects.all()
+    response_cache = department_cache
+
+
+class DepartmentStatsAPIView(ListAPIView):
+    """API view to retrieve departments with employee statistics"""
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAdminUser,)
+    throttle_scope = 'departments'
+    serializer_class = DepartmentStatsSerializer
+    queryset = Department.objects.with_stats()
+
+
+class DepartmentChangesAPIView(ChangeFeedAPIView):
+    """API view to list departments changed or deleted since a cursor"""
     serializer_class = DepartmentSerializer
     queryset = Department.objects.all()
+    throttle_scope = 'departments'
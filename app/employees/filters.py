@@ -0,0 +1,51 @@
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+class EmployeeFilterSerializer(serializers.Serializer):
+    """Serializer validating employee filter query parameters"""
+    department = serializers.IntegerField(required=False)
+    is_manager = serializers.BooleanField(required=False)
+    salary_min = serializers.DecimalField(max_digits=7, decimal_places=2,
+                                          required=False)
+    salary_max = serializers.DecimalField(max_digits=7, decimal_places=2,
+                                          required=False)
+    hired_after = serializers.DateTimeField(required=False)
+    hired_before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        """Validate ranges are not inverted"""
+        for low, high in (('salary_min', 'salary_max'),
+                          ('hired_after', 'hired_before')):
+            if low in attrs and high in attrs and attrs[low] > attrs[high]:
+                raise serializers.ValidationError(
+                    {low: [f'Must not be greater than {high}.']}
+                )
+        return attrs
+
+
+class EmployeeFilterBackend(BaseFilterBackend):
+    """Filter employees by department, manager flag, salary and hire date
+
+    Every lookup is served by an index on the Employee model.
+    """
+    lookups = {
+        'department': 'department_id',
+        'is_manager': 'is_manager',
+        'salary_min': 'salary__gte',
+        'salary_max': 'salary__lte',
+        'hired_after': 'hired_at__gte',
+        'hired_before': 'hired_at__lte',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        """Return the queryset filtered by the query parameters"""
+        serializer = EmployeeFilterSerializer(
+            data=request.query_params.dict()
+        )
+        serializer.is_valid(raise_exception=True)
+
+        return queryset.filter(**{
+            self.lookups[name]: value
+            for name, value in serializer.validated_data.items()
+        })
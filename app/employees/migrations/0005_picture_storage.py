@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:31
+
+import employees.storage
+import employees.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0004_employee_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employee',
+            name='picture',
+            field=models.ImageField(null=True, storage=employees.storage.get_picture_storage, upload_to=employees.utils.gen_pic_file_path),
+        ),
+    ]
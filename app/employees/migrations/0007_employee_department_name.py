@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0006_updated_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='department_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+    ]
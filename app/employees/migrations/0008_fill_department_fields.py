@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_department_fields(apps, schema_editor):
+    Department = apps.get_model('departments', 'Department')
+    Employee = apps.get_model('employees', 'Employee')
+
+    Employee.objects.update(department_name=Subquery(
+        Department.objects.filter(pk=OuterRef('department_id'))
+        .values('name')[:1]
+    ))
+    counts = Employee.objects.filter(department_id=OuterRef('pk')) \
+        .order_by().values('department_id')
+    # departments without employees have no group, hence no count
+    Department.objects.update(
+        employee_count=Coalesce(Subquery(
+            counts.annotate(count=Count('pk')).values('count')[:1]), 0),
+        manager_count=Coalesce(Subquery(
+            counts.annotate(count=Count('pk', filter=Q(is_manager=True)))
+            .values('count')[:1]), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0004_department_counts'),
+        ('employees', '0007_employee_department_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_department_fields,
+                             migrations.RunPython.noop),
+    ]
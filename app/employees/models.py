@@ -1,23 +1,180 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
 from django.db.models.fields import BooleanField
 from departments.models import Department
+from .storage import get_picture_storage
 from .utils import gen_pic_file_path
 
 # Create your models here.
 
 
+def count_deltas(changes):
+    """Return department count deltas of (before, after) count keys
+
+    A count key is the (department id, is manager) of a stored employee,
+    or None before creation and after deletion.
+    """
+    deltas = Counter()
+    for before, after in changes:
+        if before == after:
+            continue
+        for key, sign in ((before, -1), (after, 1)):
+            if key is not None:
+                department_id, is_manager = key
+                deltas[department_id, 'employee_count'] += sign
+                if is_manager:
+                    deltas[department_id, 'manager_count'] += sign
+    return deltas
+
+
+def set_department_names(employees):
+    """Copy the department names to employees, with at most one query"""
+    missing = {employee.department_id for employee in employees
+               if not Employee.department.is_cached(employee)}
+    names = dict(Department.objects.filter(pk__in=missing)
+                 .values_list('pk', 'name')) if missing else {}
+    for employee in employees:
+        employee.department_name = (
+            names[employee.department_id] if employee.department_id in names
+            else employee.department.name
+        )
+
+
+class EmployeeQuerySet(models.QuerySet):
+    """Queryset for Employee objects, keeping department counts in sync
+
+    `update()` bypasses the counts and department names; use `save()` or
+    `bulk_update()` to change departments or manager flags.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Insert employees, adding them to their department counts"""
+        objs = list(objs)
+        set_department_names(objs)
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            Department.objects.adjust_counts(count_deltas(
+                (None, employee.count_key) for employee in objs
+            ))
+        for employee in objs:
+            employee._stored_key = employee.count_key
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """Update employees, moving them between department counts"""
+        objs = list(objs)
+        fields = set(fields)
+        counted = fields & {'department', 'is_manager'}
+        if 'department' in fields:
+            set_department_names(objs)
+            fields.add('department_name')
+        with transaction.atomic(using=self.db):
+            if counted:
+                stored = self.lock_count_keys([employee.pk
+                                               for employee in objs])
+                changes = [(stored.get(employee.pk), employee.count_key)
+                           for employee in objs]
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            if counted:
+                Department.objects.adjust_counts(count_deltas(changes))
+        for employee in objs:
+            employee._stored_key = employee.count_key
+        return updated
+
+    def lock_count_keys(self, pks):
+        """Return the stored count keys by pk, locking the rows"""
+        return {pk: (department_id, is_manager)
+                for pk, department_id, is_manager in Employee.objects
+                .select_for_update().filter(pk__in=pks)
+                .values_list('pk', 'department_id', 'is_manager')}
+
+
 class Employee(models.Model):
     """employee model"""
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
     email = models.EmailField(max_length=255, unique=True)
     salary = models.DecimalField(max_digits=7, decimal_places=2)
-    picture = models.ImageField(null=True, upload_to=gen_pic_file_path)
+    picture = models.ImageField(null=True, upload_to=gen_pic_file_path,
+                                storage=get_picture_storage)
     hired_at = models.DateTimeField(null=True)
     department = models.ForeignKey(Department, on_delete=models.PROTECT)
+    # copy of department.name, kept in sync by saves and department renames
+    department_name = models.CharField(max_length=255, editable=False,
+                                       default='')
     is_manager = BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EmployeeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='employee_created_at_id_idx'),
+            models.Index(fields=['updated_at', 'id'],
+                         name='employee_updated_at_id_idx'),
+            models.Index(fields=['department', 'is_manager'],
+                         name='employee_dept_manager_idx'),
+            models.Index(fields=['hired_at'],
+                         name='employee_hired_at_idx'),
+            models.Index(fields=['salary'],
+                         name='employee_salary_idx'),
+            models.Index(fields=['last_name', 'first_name'],
+                         name='employee_last_first_name_idx'),
+            models.Index(fields=['first_name'],
+                         name='employee_first_name_idx'),
+        ]
+
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'department_id' in instance.__dict__ \
+                and 'is_manager' in instance.__dict__:
+            instance._stored_key = instance.count_key
+        return instance
+
+    @property
+    def count_key(self):
+        """Return the department count key of the current values"""
+        return (self.department_id, bool(self.is_manager))
+
+    def get_stored_key(self, lock=False):
+        """Return the count key stored in the database, None if unsaved
+
+        With lock, the key is read again and the row locked until the
+        transaction ends, so concurrent moves can't both count it.
+        """
+        if self._state.adding:
+            return None
+        if lock or not hasattr(self, '_stored_key'):
+            queryset = Employee.objects.filter(pk=self.pk)
+            if lock:
+                queryset = queryset.select_for_update()
+            self._stored_key = queryset \
+                .values_list('department_id', 'is_manager').first()
+        return self._stored_key
+
+    def save(self, *args, **kwargs):
+        """Save, keeping the department name and counts in sync"""
+        update_fields = kwargs.get('update_fields')
+        counted = update_fields is None or \
+            {'department', 'is_manager'} & set(update_fields)
+        with transaction.atomic():
+            before = self.get_stored_key(lock=True) if counted else None
+            if counted and (before is None or before[0] != self.department_id
+                            or not self.department_name):
+                set_department_names([self])
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields,
+                                               'department_name'}
+            super().save(*args, **kwargs)
+            if counted:
+                Department.objects.adjust_counts(
+                    count_deltas([(before, self.count_key)]))
+        if counted:
+            self._stored_key = self.count_key
@@ -1,16 +1,209 @@
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from core.events import publish_change
+from core.serializers import DynamicFieldsMixin
+from departments.models import Department
+from departments.serializers import DepartmentSerializer
 from .models import Employee
+from .thumbnails import generated_thumbnail_names
+
+
+class PictureField(serializers.ImageField):
+    """Image field trusting pictures validated by PictureUploadHandler"""
+
+    def to_internal_value(self, data):
+        """Validate a picture without decoding it again when possible"""
+        error = getattr(data, 'upload_error', None)
+        if error:
+            raise serializers.ValidationError(error)
+        if getattr(data, 'image_format', None):
+            # format and dimensions were read from the streamed header
+            return serializers.FileField.to_internal_value(self, data)
 
+        return super().to_internal_value(data)
 
-class EmployeeSerializer(serializers.ModelSerializer):
+
+class EmployeeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Employee objects"""
+    picture = PictureField(required=False, allow_null=True)
+    thumbnails = serializers.SerializerMethodField()
+    expandable_fields = {'department': DepartmentSerializer}
+    projections = {'thumbnails': ('picture',)}
 
     class Meta:
         model = Employee
-        fields = '__all__'
+        exclude = ('department_name',)
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+    def get_thumbnails(self, obj):
+        """Return thumbnail URLs of the picture, keyed by size name"""
+        return self.get_thumbnail_urls(obj.picture.name)
+
+    def get_thumbnail_urls(self, picture):
+        """Return thumbnail URLs of a picture name, keyed by size name
+
+        None until the thumbnails are generated.
+        """
+        names = generated_thumbnail_names(picture) if picture else None
+        if not names:
+            return None
+
+        request = self.context.get('request')
+        urls = {}
+        for size, name in names.items():
+            url = default_storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request else url
+        return urls
+
+    def get_converter(self, name, field):
+        """Represent thumbnails from the picture name"""
+        if name == 'thumbnails':
+            return 'picture', self.get_thumbnail_urls
+        return super().get_converter(name, field)
+
 
 class EmployeeDetailsSerializer(EmployeeSerializer):
     """Serializer for Employee Details objects"""
-    department = serializers.StringRelatedField()
+    department = serializers.CharField(source='department_name',
+                                       read_only=True)
+
+
+class BulkDepartmentField(serializers.PrimaryKeyRelatedField):
+    """Department field resolved from departments preloaded by the parent"""
+
+    def to_internal_value(self, data):
+        """Return the preloaded department instead of querying for it"""
+        departments = getattr(self.root, 'departments', None)
+        if departments is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return departments[int(data)]
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class EmployeeBulkListSerializer(serializers.ListSerializer):
+    """Serializer validating and saving many Employee objects at once"""
+    batch_size = 1000
+
+    def to_internal_value(self, data):
+        """Validate every item, running set-based queries for the batch"""
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(
+                input_type=type(data).__name__
+            )
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [message]
+            }, code='not_a_list')
+
+        if not self.allow_empty and len(data) == 0:
+            message = self.error_messages['empty']
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [message]
+            }, code='empty')
+
+        items = [item if isinstance(item, dict) else {} for item in data]
+        instances = self.instance or [None] * len(data)
+        self.departments = self._preload_departments(items)
+        owners = self._email_owners(items)
+
+        ret = []
+        errors = []
+        seen = set()
+        for item, instance in zip(data, instances):
+            self.child.instance = instance
+            try:
+                validated = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+                continue
+
+            email = validated.get('email')
+            pk = instance.pk if instance else None
+            if email in seen:
+                errors.append({'email': ['Duplicated in this request.']})
+            elif email in owners and owners[email] != pk:
+                errors.append(
+                    {'email': ['employee with this email already exists.']}
+                )
+            else:
+                errors.append({})
+                ret.append(validated)
+            if email is not None:
+                seen.add(email)
+
+        self.child.instance = None
+        self.departments = None
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return ret
+
+    def _preload_departments(self, items):
+        """Return requested departments mapped by id with one query"""
+        ids = set()
+        for item in items:
+            try:
+                ids.add(int(item.get('department')))
+            except (TypeError, ValueError):
+                pass
+        return Department.objects.in_bulk(ids)
+
+    def _email_owners(self, items):
+        """Return existing employee ids mapped by email with one query"""
+        emails = {item['email'] for item in items
+                  if isinstance(item.get('email'), str)}
+        return dict(Employee.objects.filter(email__in=emails)
+                    .values_list('email', 'id'))
+
+    def create(self, validated_data):
+        """Insert all employees with bulk_create"""
+        employees = [Employee(**attrs) for attrs in validated_data]
+        Employee.objects.bulk_create(employees, batch_size=self.batch_size)
+
+        if any(employee.pk is None for employee in employees):
+            # Not every backend returns primary keys from a bulk insert
+            created = Employee.objects.in_bulk(
+                [employee.email for employee in employees],
+                field_name='email'
+            )
+            employees = [created[employee.email] for employee in employees]
+
+        publish_change('employees', 'employee.created',
+                       [employee.pk for employee in employees])
+        return employees
+
+    def update(self, instances, validated_data):
+        """Save all changed fields with bulk_update"""
+        fields = {'updated_at'}
+        now = timezone.now()
+        for instance, attrs in zip(instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(instance, attr, value)
+            instance.updated_at = now
+            fields.update(attrs)
+
+        Employee.objects.bulk_update(instances, fields,
+                                     batch_size=self.batch_size)
+        publish_change('employees', 'employee.updated',
+                       [instance.pk for instance in instances])
+        return instances
+
+
+class EmployeeBulkSerializer(EmployeeSerializer):
+    """Serializer for Employee objects sent in bulk"""
+    department = BulkDepartmentField(queryset=Department.objects.all())
+
+    class Meta(EmployeeSerializer.Meta):
+        list_serializer_class = EmployeeBulkListSerializer
+        # email uniqueness is checked for the whole batch by the list
+        extra_kwargs = {'email': {'validators': []}}
@@ -0,0 +1,51 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.events import publish_change
+from core.models import Tombstone
+from departments.models import Department
+
+from .models import Employee, count_deltas
+from .thumbnails import enqueue_thumbnails
+
+
+@receiver(pre_save, sender=Employee)
+def track_picture_upload(sender, instance, **kwargs):
+    """Remember whether a new picture is about to be stored"""
+    instance._picture_uploaded = bool(instance.picture) and \
+        not instance.picture._committed
+
+
+@receiver(post_save, sender=Employee)
+def generate_picture_thumbnails(sender, instance, **kwargs):
+    """Generate thumbnails of a newly stored picture"""
+    if getattr(instance, '_picture_uploaded', False):
+        instance._picture_uploaded = False
+        enqueue_thumbnails(instance.picture.name)
+
+
+@receiver(post_delete, sender=Employee)
+def record_employee_deletion(sender, instance, **kwargs):
+    """Record a tombstone for the change feed"""
+    Tombstone.record(instance)
+
+
+@receiver(post_save, sender=Employee)
+def publish_employee_save(sender, instance, created, **kwargs):
+    """Publish the change to event stream subscribers"""
+    publish_change('employees',
+                   'employee.created' if created else 'employee.updated',
+                   [instance.pk])
+
+
+@receiver(post_delete, sender=Employee)
+def publish_employee_deletion(sender, instance, **kwargs):
+    """Publish the deletion to event stream subscribers"""
+    publish_change('employees', 'employee.deleted', [instance.pk])
+
+
+@receiver(post_delete, sender=Employee)
+def remove_from_department_counts(sender, instance, **kwargs):
+    """Remove a deleted employee from its department counts"""
+    stored_key = getattr(instance, '_stored_key', instance.count_key)
+    Department.objects.adjust_counts(count_deltas([(stored_key, None)]))
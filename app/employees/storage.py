@@ -0,0 +1,37 @@
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from .utils import file_digest, gen_content_file_path
+
+
+class PictureStorage(FileSystemStorage):
+    """File system storage naming files by a hash of their content
+
+    Identical content gets the same name, so saving it again keeps the
+    existing file instead of writing a copy.
+    """
+
+    def save(self, name, content, max_length=None):
+        """Save content under its content addressed name"""
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = gen_content_file_path(name, file_digest(content))
+        try:
+            # a reused file is as recent as a new one for cleanup_pictures
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name
+
+
+picture_storage = PictureStorage()
+
+
+def get_picture_storage():
+    """Return the storage of employees pictures"""
+    return picture_storage
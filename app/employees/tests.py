@@ -1,22 +1,39 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.db import connection
+from django.core.files.storage import default_storage
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework import serializers, status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
 
 from .models import Employee
+from core.changes import CHANGE_FEED_SETTINGS, encode_cursor
 from departments.models import Department
 
-from .serializers import EmployeeDetailsSerializer
+from .serializers import EmployeeDetailsSerializer, EmployeeSerializer
+from .thumbnails import thumbnail_names
+from .views import EmployeeExportAPIView
 
+import csv
+import datetime
+import hashlib
+import io
+import json
 import tempfile
 import os
 
+from unittest import mock
+
 from PIL import Image
 
 EMPLOYEES_URL = reverse('employees:employee-list')
+EXPORT_URL = reverse('employees:employee-export')
+BULK_URL = reverse('employees:employee-bulk')
+CHANGES_URL = reverse('employees:employee-changes')
 
 
 def detail_url(employee_id):
@@ -90,12 +107,247 @@ class PrivateEmployeesApiTests(TestCase):
         employees = Employee.objects.all()
         serializer = EmployeeDetailsSerializer(employees, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
-        self.assertEqual(len(res.data), 2)
-        self.assertEqual(res.data[0]['last_name'], 'Smith')
-        self.assertEqual(res.data[0]['is_manager'], False)
-        self.assertEqual(res.data[1]['department'], 'IT')
-        self.assertEqual(res.data[1]['is_manager'], True)
+        results = res.data['results']
+        self.assertEqual(results, serializer.data)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['last_name'], 'Smith')
+        self.assertEqual(results[0]['is_manager'], False)
+        self.assertEqual(results[1]['department'], 'IT')
+        self.assertEqual(results[1]['is_manager'], True)
+
+    def test_retrieve_employees_constant_queries(self):
+        """Test listing employees doesn't query departments per row"""
+        it = sample_department('IT', 'IT DEPARTMENT')
+        hr = sample_department('HR', 'HR DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), it, False)
+
+        with CaptureQueriesContext(connection) as few:
+            self.super_client.get(EMPLOYEES_URL)
+
+        for i in range(10):
+            sample_employee('John', f'Doe{i}', f'johndoe{i}@test.com',
+                            7500.00, timezone.now(), [it, hr][i % 2], False)
+
+        with self.assertNumQueries(len(few)):
+            res = self.super_client.get(EMPLOYEES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 11)
+
+    def test_retrieve_employees_paginated(self):
+        """Test employees are paginated with an opaque cursor"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        for i in range(3):
+            sample_employee('John', f'Doe{i}', f'johndoe{i}@test.com',
+                            7500.00, timezone.now(), department, False)
+
+        res = self.super_client.get(EMPLOYEES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNone(res.data['previous'])
+        self.assertIn('cursor=', res.data['next'])
+
+        res = self.super_client.get(res.data['next'])
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['last_name'], 'Doe2')
+        self.assertIsNone(res.data['next'])
+        self.assertIsNotNone(res.data['previous'])
+
+    def test_filter_employees(self):
+        """Test filtering employees by query parameters"""
+        it = sample_department('IT', 'IT DEPARTMENT')
+        hr = sample_department('HR', 'HR DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), it, False)
+        sample_employee('Jane', 'Doe', 'jane@test.com',
+                        9000.00, timezone.now(), it, True)
+        sample_employee('Adam', 'Brown', 'adam@test.com',
+                        5000.00, timezone.now(), hr, True)
+
+        def emails(params):
+            res = self.super_client.get(EMPLOYEES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return {item['email'] for item in res.data['results']}
+
+        self.assertEqual(emails({'department': it.id, 'is_manager': 'true'}),
+                         {'jane@test.com'})
+        self.assertEqual(emails({'salary_min': '6000', 'salary_max': '8000'}),
+                         {'john@test.com'})
+        self.assertEqual(emails({'hired_after': timezone.now()}), set())
+        self.assertEqual(emails({'search': 'ja'}), {'jane@test.com'})
+        self.assertEqual(emails({'search': 'own'}), set())
+
+    def test_order_employees(self):
+        """Test ordering employees by a whitelisted field"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), department, False)
+        sample_employee('Jane', 'Doe', 'jane@test.com',
+                        9000.00, timezone.now(), department, True)
+
+        def emails(ordering):
+            res = self.super_client.get(EMPLOYEES_URL, {'ordering': ordering})
+            return [employee['email'] for employee in res.data['results']]
+
+        self.assertEqual(emails('-salary'), ['jane@test.com', 'john@test.com'])
+        self.assertEqual(emails('last_name'),
+                         ['jane@test.com', 'john@test.com'])
+        self.assertEqual(emails('-last_name'),
+                         ['john@test.com', 'jane@test.com'])
+
+    def test_order_employees_unknown_field_ignored(self):
+        """Test ordering by a field outside the whitelist is ignored"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), department, False)
+        sample_employee('Jane', 'Doe', 'jane@test.com',
+                        9000.00, timezone.now(), department, True)
+
+        res = self.super_client.get(EMPLOYEES_URL, {'ordering': 'email'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # the default creation order, not the email order
+        self.assertEqual([employee['email']
+                          for employee in res.data['results']],
+                         ['john@test.com', 'jane@test.com'])
+
+    def test_order_employees_nullable_field_ignored(self):
+        """Test ordering by the nullable hire date is ignored when paging"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, None, department, False)
+        sample_employee('Jane', 'Doe', 'jane@test.com',
+                        9000.00, timezone.now(), department, True)
+
+        res = self.super_client.get(EMPLOYEES_URL, {'ordering': 'hired_at',
+                                                    'page_size': 1})
+        emails = [employee['email'] for employee in res.data['results']]
+        res = self.super_client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        emails += [employee['email'] for employee in res.data['results']]
+        self.assertEqual(emails, ['john@test.com', 'jane@test.com'])
+
+    def test_filter_employees_invalid(self):
+        """Test invalid filter parameters are rejected"""
+        res = self.super_client.get(EMPLOYEES_URL, {'salary_min': 'high'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('salary_min', res.data)
+
+        res = self.super_client.get(EMPLOYEES_URL, {'salary_min': '9000',
+                                                    'salary_max': '10'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_employees_sparse_fields(self):
+        """Test selecting fields narrows the output and the query"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), department, False)
+        sample_employee('John', 'Doe', 'johndoe@test.com',
+                        7500.00, timezone.now(), department, False)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.super_client.get(EMPLOYEES_URL,
+                                        {'fields': 'first_name,department',
+                                         'page_size': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0],
+                         {'first_name': 'John', 'department': 'IT'})
+        # one aggregate for the validators, one select for the page
+        self.assertEqual(len(queries), 2)
+        select = queries[-1]['sql']
+        self.assertIn('"first_name"', select)
+        self.assertNotIn('"salary"', select)
+        self.assertNotIn('"description"', select)
+
+    def test_employee_details_expand_department(self):
+        """Test expanding the department with a single joined query"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        employee = sample_employee('John', 'Simth', 'john@test.com',
+                                   7500.0, timezone.now(), department, False)
+
+        with self.assertNumQueries(1):
+            res = self.super_client.get(detail_url(employee.id),
+                                        {'fields': 'email,department',
+                                         'expand': 'department'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data), {'email', 'department'})
+        self.assertEqual(res.data['department']['id'], department.id)
+        self.assertEqual(res.data['department']['description'],
+                         department.description)
+
+    def test_employee_details_single_query(self):
+        """Test employee details retrieves department in the same query"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        employee = sample_employee('John', 'Simth', 'john@test.com',
+                                   7500.0, timezone.now(), department, False)
+
+        with self.assertNumQueries(1):
+            res = self.super_client.get(detail_url(employee.id))
+
+        self.assertEqual(res.data['department'], department.name)
+
+    def test_employee_details_not_modified(self):
+        """Test employee details honour ETag and Last-Modified"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        employee = sample_employee('John', 'Simth', 'john@test.com',
+                                   7500.0, timezone.now(), department, False)
+        url = detail_url(employee.id)
+
+        res = self.super_client.get(url)
+        etag = res['ETag']
+        self.assertIn('Last-Modified', res)
+
+        res = self.super_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+        self.super_client.patch(url, {'salary': 5000.0})
+        res = self.super_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_retrieve_employees_not_modified(self):
+        """Test employees list is versioned by employees and departments"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), department, False)
+
+        etag = self.super_client.get(EMPLOYEES_URL)['ETag']
+        res = self.super_client.get(EMPLOYEES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        department.name = 'NEW IT'
+        department.save()
+        res = self.super_client.get(EMPLOYEES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['department'], 'NEW IT')
+
+    def test_retrieve_employees_modified_by_deletion(self):
+        """Test deleting an employee changes the list Last-Modified"""
+        department = sample_department('IT', 'IT DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), department, False)
+        employee = sample_employee('Jane', 'Doe', 'jane@test.com',
+                                   9000.00, timezone.now(), department, True)
+        Employee.objects.update(
+            updated_at=timezone.now() - datetime.timedelta(hours=1))
+
+        last_modified = self.super_client.get(EMPLOYEES_URL)['Last-Modified']
+        res = self.super_client.get(EMPLOYEES_URL,
+                                    HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.super_client.delete(detail_url(employee.id))
+        res = self.super_client.get(EMPLOYEES_URL,
+                                    HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
 
     def test_create_employee_successful(self):
         """Test creating a new employee"""
@@ -203,6 +455,408 @@ class PrivateEmployeesApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
 
+class EmployeeExportApiTests(TestCase):
+    """Test the employees export API"""
+
+    def setUp(self):
+        self.super_user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        self.super_client = APIClient()
+        self.super_client.force_authenticate(self.super_user)
+        department = sample_department('IT', 'IT DEPARTMENT')
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), department, False)
+        sample_employee('John', 'Doe', 'johndoe@test.com',
+                        17500.00, timezone.now(), department, True)
+
+    def test_login_required(self):
+        """Test that login is required for exporting employees"""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_ndjson(self):
+        """Test exporting employees as newline delimited JSON"""
+        res = self.super_client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+
+        employees = Employee.objects.order_by('id')
+        serializer = EmployeeDetailsSerializer(employees, many=True)
+        self.assertEqual(rows, json.loads(json.dumps(serializer.data)))
+        self.assertEqual(rows[1]['department'], 'IT')
+
+    def test_export_without_values_representation(self):
+        """Test serializers unsupported by the values path still export"""
+        expected = b''.join(self.super_client.get(EXPORT_URL)
+                            .streaming_content)
+
+        with mock.patch.object(EmployeeDetailsSerializer,
+                               'get_values_representation',
+                               return_value=None):
+            res = self.super_client.get(EXPORT_URL)
+
+        self.assertEqual(b''.join(res.streaming_content), expected)
+
+    async def test_export_asgi_chunks(self):
+        """Test exports are streamed asynchronously in chunks under ASGI"""
+        token = await Token.objects.acreate(user=self.super_user)
+        headers = {'authorization': f'Token {token.key}'}
+
+        with mock.patch.object(EmployeeExportAPIView, 'chunk_size', 1):
+            res = await AsyncClient().get(EXPORT_URL, headers=headers)
+            self.assertTrue(res.is_async)
+            chunks = [chunk async for chunk in res.streaming_content]
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(json.loads(chunks[0])['email'], 'john@test.com')
+
+    def test_export_csv(self):
+        """Test exporting employees as CSV"""
+        res = self.super_client.get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(set(rows[0]),
+                         set(EmployeeDetailsSerializer().fields))
+        self.assertEqual(rows[0]['email'], 'john@test.com')
+        self.assertEqual(rows[1]['department'], 'IT')
+
+    def test_export_csv_nested_values(self):
+        """Test nested values are exported to CSV as JSON"""
+        Employee.objects.filter(email='john@test.com') \
+            .update(picture='pictures/john.jpg')
+        urls = {'small': 'http://testserver/media/john_small.jpg'}
+
+        with mock.patch.object(EmployeeSerializer, 'get_thumbnail_urls',
+                               return_value=urls):
+            res = self.super_client.get(EXPORT_URL, {'format': 'csv'})
+            content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(json.loads(rows[0]['thumbnails']), urls)
+
+    def test_export_pages(self):
+        """Test employees are read by pages of chunk_size ids"""
+        with mock.patch.object(EmployeeExportAPIView, 'chunk_size', 1), \
+                CaptureQueriesContext(connection) as queries:
+            res = self.super_client.get(EXPORT_URL)
+            lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual([json.loads(line)['email'] for line in lines],
+                         ['john@test.com', 'johndoe@test.com'])
+        pages = [query['sql'] for query in queries
+                 if 'employees_employee' in query['sql']]
+        self.assertEqual(len(pages), 3)
+        self.assertIn('LIMIT 1', pages[-1])
+
+
+@mock.patch.dict(CHANGE_FEED_SETTINGS, LAG=0)
+class EmployeeChangesApiTests(TestCase):
+    """Test the employees change feed API"""
+
+    def setUp(self):
+        self.super_user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        self.super_client = APIClient()
+        self.super_client.force_authenticate(self.super_user)
+        self.department = sample_department('IT', 'IT DEPARTMENT')
+        self.employees = [
+            sample_employee('John', name, f'{name.lower()}@test.com',
+                            7500.00, timezone.now(), self.department, False)
+            for name in ('Smith', 'Doe', 'Roe')
+        ]
+
+    def test_login_required(self):
+        """Test that login is required for the change feed"""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_resumable_pages(self):
+        """Test changes are listed in bounded pages resuming at the cursor"""
+        res = self.super_client.get(CHANGES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['email'] for row in res.data['upserts']],
+                         ['smith@test.com', 'doe@test.com'])
+        self.assertEqual(res.data['upserts'][0]['department'], 'IT')
+        self.assertIsNotNone(res.data['next'])
+
+        res = self.super_client.get(res.data['next'])
+        self.assertEqual([row['email'] for row in res.data['upserts']],
+                         ['roe@test.com'])
+        self.assertIsNone(res.data['next'])
+
+        res = self.super_client.get(CHANGES_URL,
+                                    {'since': res.data['cursor']})
+        self.assertEqual(res.data['upserts'], [])
+        self.assertEqual(res.data['deletes'], [])
+
+    def test_updates_and_deletes(self):
+        """Test updates and deletions after the cursor are listed"""
+        cursor = self.super_client.get(CHANGES_URL).data['cursor']
+        smith, doe, _ = self.employees
+        smith.salary = 8000
+        smith.save()
+        deleted_id = doe.id
+        doe.delete()
+
+        res = self.super_client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual([employee['id'] for employee in res.data['upserts']],
+                         [smith.id])
+        self.assertEqual(res.data['upserts'][0]['salary'], '8000.00')
+        self.assertEqual(res.data['deletes'], [deleted_id])
+
+    def test_bulk_delete_recorded(self):
+        """Test employees deleted in bulk get tombstones"""
+        cursor = self.super_client.get(CHANGES_URL).data['cursor']
+        ids = [employee.id for employee in self.employees[:2]]
+        self.super_client.delete(BULK_URL, ids, format='json')
+
+        res = self.super_client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(sorted(res.data['deletes']), sorted(ids))
+
+    def test_recent_changes_held_back(self):
+        """Test changes newer than the lag are listed once old enough"""
+        with mock.patch.dict(CHANGE_FEED_SETTINGS, LAG=60):
+            res = self.super_client.get(CHANGES_URL)
+
+        self.assertEqual(res.data['upserts'], [])
+        res = self.super_client.get(CHANGES_URL,
+                                    {'since': res.data['cursor']})
+        self.assertEqual(len(res.data['upserts']), 3)
+
+    def test_quiet_feed_cursor_advances(self):
+        """Test a cursor polled without changes doesn't expire"""
+        cursor = self.super_client.get(CHANGES_URL).data['cursor']
+        now = timezone.now()
+
+        for days in (20, 40):
+            with mock.patch('django.utils.timezone.now',
+                            return_value=now + datetime.timedelta(days=days)):
+                res = self.super_client.get(CHANGES_URL, {'since': cursor})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['upserts'], [])
+            cursor = res.data['cursor']
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor is rejected"""
+        res = self.super_client.get(CHANGES_URL, {'since': 'nope'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_cursor(self):
+        """Test a cursor older than the tombstone retention is gone"""
+        cursor = encode_cursor(
+            (timezone.now() - datetime.timedelta(days=365), 0, 0)
+        )
+
+        res = self.super_client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+
+class EmployeeValuesRepresentationTests(TestCase):
+    """Test serializing employees from values matches the serializers"""
+
+    def setUp(self):
+        department = sample_department('IT', 'IT DEPARTMENT')
+        hired_at = datetime.datetime(2020, 1, 1, 12, 30, 15, 123456,
+                                     tzinfo=datetime.timezone.utc)
+        employee = sample_employee('John', 'Smith', 'john@test.com',
+                                   7500.5, hired_at, department, True)
+        employee.picture = 'pictures/ab/abcdef.jpg'
+        employee.save()
+        sample_employee('Jane', 'Doe', 'jane@test.com',
+                        17500, None, department, False)
+        self.request = APIRequestFactory().get('/')
+
+    def assertSameRepresentation(self, serializer_class, **kwargs):
+        serializer = serializer_class(context={'request': self.request},
+                                      **kwargs)
+        lookups, represent = serializer.get_values_representation()
+        rows = Employee.objects.order_by('id').values(*lookups)
+        expected = serializer_class(
+            Employee.objects.select_related('department').order_by('id'),
+            many=True, context={'request': self.request}, **kwargs
+        ).data
+
+        self.assertEqual([represent(row) for row in rows], expected)
+
+    def test_details_serializer(self):
+        """Test every field matches EmployeeDetailsSerializer"""
+        self.assertSameRepresentation(EmployeeDetailsSerializer)
+
+    def test_serializer(self):
+        """Test every field matches EmployeeSerializer"""
+        self.assertSameRepresentation(EmployeeSerializer)
+
+    def test_sparse_and_expanded_fields(self):
+        """Test selected and expanded fields match"""
+        self.assertSameRepresentation(EmployeeDetailsSerializer,
+                                      fields=['id', 'thumbnails'])
+        self.assertSameRepresentation(EmployeeDetailsSerializer,
+                                      expand=['department'])
+
+    def test_method_field_unsupported(self):
+        """Test serializers with unknown method fields can't be used"""
+        class Serializer(EmployeeSerializer):
+            full_name = serializers.SerializerMethodField()
+
+            def get_full_name(self, obj):
+                return str(obj)
+
+        self.assertIsNone(Serializer().get_values_representation())
+
+    def test_list_api(self):
+        """Test the list API returns the serializer's representation"""
+        user = get_user_model().objects.create_superuser('test_super_user',
+                                                         'password123')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.assertNumQueries(2):
+            res = client.get(EMPLOYEES_URL, {'ordering': 'salary'})
+
+        request = APIRequestFactory().get(EMPLOYEES_URL)
+        employees = Employee.objects.order_by('salary')
+        serializer = EmployeeDetailsSerializer(
+            employees, many=True, context={'request': request}
+        )
+        self.assertEqual(res.data['results'], serializer.data)
+
+
+class EmployeeBulkApiTests(TestCase):
+    """Test the employees bulk API"""
+
+    def setUp(self):
+        self.super_user = get_user_model().objects.create_superuser(
+            'test_super_user',
+            'password123'
+        )
+        self.super_client = APIClient()
+        self.super_client.force_authenticate(self.super_user)
+        self.department = sample_department('IT', 'IT DEPARTMENT')
+
+    def payload(self, count, start=0):
+        """Return a list of employees to create"""
+        return [{'first_name': 'Test', 'last_name': f'Name{i}',
+                 'email': f'test{i}@email.com', 'salary': '7500.00',
+                 'department': self.department.id, 'is_manager': False}
+                for i in range(start, start + count)]
+
+    def test_login_required(self):
+        """Test that login is required for bulk operations"""
+        res = APIClient().post(BULK_URL, self.payload(1), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_create(self):
+        """Test creating a list of employees"""
+        res = self.super_client.post(BULK_URL, self.payload(3), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[2]['email'], 'test2@email.com')
+        self.assertTrue(all(item['id'] for item in res.data))
+        self.assertEqual(Employee.objects.count(), 3)
+
+    def test_bulk_create_constant_queries(self):
+        """Test validating a batch doesn't query per item"""
+        with CaptureQueriesContext(connection) as few:
+            self.super_client.post(BULK_URL, self.payload(2), format='json')
+
+        with self.assertNumQueries(len(few)):
+            res = self.super_client.post(BULK_URL, self.payload(20, 2),
+                                         format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Employee.objects.count(), 22)
+
+    def test_bulk_create_errors_per_item(self):
+        """Test invalid items are reported and nothing is created"""
+        sample_employee('John', 'Smith', 'john@test.com',
+                        7500.00, timezone.now(), self.department, False)
+        payload = self.payload(4)
+        payload[1]['email'] = 'john@test.com'
+        payload[2]['email'] = payload[0]['email']
+        payload[3]['department'] = 0
+
+        res = self.super_client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('email', res.data[1])
+        self.assertIn('email', res.data[2])
+        self.assertIn('department', res.data[3])
+        self.assertEqual(Employee.objects.count(), 1)
+
+    def test_bulk_update(self):
+        """Test partially updating a list of employees"""
+        res = self.super_client.post(BULK_URL, self.payload(2), format='json')
+        payload = [{'id': res.data[0]['id'], 'salary': '5000.00'},
+                   {'id': res.data[1]['id'], 'is_manager': True,
+                    'email': res.data[1]['email']}]
+
+        res = self.super_client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        first = Employee.objects.get(id=payload[0]['id'])
+        second = Employee.objects.get(id=payload[1]['id'])
+        self.assertEqual(str(first.salary), '5000.00')
+        self.assertTrue(second.is_manager)
+        self.assertGreater(first.updated_at, first.created_at)
+
+    def test_bulk_update_errors_per_item(self):
+        """Test unknown ids and taken emails are reported per item"""
+        res = self.super_client.post(BULK_URL, self.payload(2), format='json')
+
+        payload = [{'id': res.data[0]['id'], 'email': 'test1@email.com'},
+                   {'id': 0, 'salary': '5000.00'}]
+        res = self.super_client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+
+        payload = payload[:1]
+        res = self.super_client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', res.data[0])
+
+    def test_bulk_delete(self):
+        """Test deleting a list of employees"""
+        res = self.super_client.post(BULK_URL, self.payload(3), format='json')
+        ids = [item['id'] for item in res.data[:2]]
+
+        res = self.super_client.delete(BULK_URL, ids, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Employee.objects.count(), 1)
+
+    def test_bulk_rejects_non_list(self):
+        """Test bulk operations require a list"""
+        res = self.super_client.post(BULK_URL, self.payload(1)[0],
+                                     format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class EmployeePictureUploadTests(TestCase):
 
     def setUp(self):
@@ -218,8 +872,22 @@ class EmployeePictureUploadTests(TestCase):
                                         department, False)
 
     def tearDown(self):
+        self.employee.refresh_from_db()
+        if self.employee.picture:
+            for name in thumbnail_names(self.employee.picture.name).values():
+                default_storage.delete(name)
         self.employee.picture.delete()
 
+    def upload_picture(self, size=(10, 10), image_format='JPEG'):
+        """Upload a noisy picture of a size and format to the employee"""
+        url = detail_url(self.employee.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as temp:
+            img = Image.effect_noise(size, 100).convert('RGB')
+            img.save(temp, format=image_format)
+            temp.seek(0)
+            return self.super_client.patch(
+                url, {'picture': temp}, format='multipart')
+
     def test_upload_picture_to_employee(self):
         """Test uploading a picture to employee"""
         url = detail_url(self.employee.id)
@@ -235,6 +903,164 @@ class EmployeePictureUploadTests(TestCase):
         self.assertIn('picture', res.data)
         self.assertTrue(os.path.exists(self.employee.picture.path))
 
+    @override_settings(THUMBNAILS={'SYNC': True})
+    def test_upload_picture_generates_thumbnails(self):
+        """Test uploading a picture generates its thumbnails"""
+        res = self.upload_picture(size=(400, 200))
+
+        self.employee.refresh_from_db()
+        names = thumbnail_names(self.employee.picture.name)
+        self.assertEqual(set(res.data['thumbnails']), {'small', 'medium'})
+        self.assertTrue(res.data['thumbnails']['small'].endswith(
+            default_storage.url(names['small'])))
+        with default_storage.open(names['small']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (64, 32))
+        with default_storage.open(names['medium']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).format, 'WEBP')
+
+    @override_settings(THUMBNAILS={'SYNC': True})
+    def test_upload_picture_thumbnails_exif_orientation(self):
+        """Test thumbnails are rotated by the EXIF orientation"""
+        url = detail_url(self.employee.id)
+        exif = Image.Exif()
+        # rotated 90 degrees clockwise
+        exif[0x0112] = 6
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as temp:
+            img = Image.effect_noise((400, 200), 100).convert('RGB')
+            img.save(temp, format='JPEG', exif=exif)
+            temp.seek(0)
+            self.super_client.patch(url, {'picture': temp},
+                                    format='multipart')
+
+        self.employee.refresh_from_db()
+        names = thumbnail_names(self.employee.picture.name)
+        with default_storage.open(names['small']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (32, 64))
+
+    def test_upload_picture_thumbnails_after_commit(self):
+        """Test thumbnails are generated in the background after commit"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.upload_picture()
+
+        self.employee.refresh_from_db()
+        # the thumbnails, then the change event
+        self.assertEqual(len(callbacks), 2)
+        names = thumbnail_names(self.employee.picture.name)
+        self.assertFalse(default_storage.exists(names['small']))
+        self.assertIsNone(res.data['thumbnails'])
+
+        updated_at = self.employee.updated_at
+        with mock.patch('employees.thumbnails.get_executor') as executor, \
+                mock.patch('employees.thumbnails.publish_change') as publish:
+            executor.return_value.submit.side_effect = \
+                lambda function, *args: function(*args)
+            callbacks[0]()
+
+        self.assertTrue(default_storage.exists(names['small']))
+        self.employee.refresh_from_db()
+        self.assertGreater(self.employee.updated_at, updated_at)
+        publish.assert_called_once_with('employees', 'employee.updated',
+                                        [self.employee.pk])
+        res = self.super_client.get(detail_url(self.employee.id))
+        self.assertEqual(set(res.data['thumbnails']), {'small', 'medium'})
+
+    def test_upload_picture_thumbnails_failed(self):
+        """Test thumbnails aren't listed when their generation fails"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.upload_picture()
+
+        with mock.patch('employees.thumbnails.get_executor') as executor, \
+                mock.patch('employees.thumbnails.Image.open',
+                           side_effect=OSError), \
+                self.assertLogs('employees.thumbnails', 'ERROR'):
+            executor.return_value.submit.side_effect = \
+                lambda function, *args: function(*args)
+            callbacks[0]()
+
+        res = self.super_client.get(detail_url(self.employee.id))
+        self.assertIsNone(res.data['thumbnails'])
+
+    def test_upload_picture_deduplicated(self):
+        """Test identical pictures are stored once under their hash"""
+        other = sample_employee('Jane', 'Doe', 'jane@test.com', 7500.0,
+                                timezone.now(), self.employee.department,
+                                False)
+        with tempfile.NamedTemporaryFile(suffix='.JPG') as temp:
+            Image.new('RGB', (10, 10)).save(temp, format='JPEG')
+            temp.seek(0)
+            digest = hashlib.sha256(temp.read()).hexdigest()
+            for employee in (self.employee, other):
+                temp.seek(0)
+                self.super_client.patch(detail_url(employee.id),
+                                        {'picture': temp}, format='multipart')
+
+        self.employee.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.employee.picture.name,
+                         f'pictures/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(other.picture.name, self.employee.picture.name)
+
+    def test_upload_picture_deduplicated_refreshed(self):
+        """Test reusing a stored picture protects it from cleanup"""
+        url = detail_url(self.employee.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as temp:
+            Image.new('RGB', (10, 10)).save(temp, format='JPEG')
+            temp.seek(0)
+            self.super_client.patch(url, {'picture': temp},
+                                    format='multipart')
+            self.employee.refresh_from_db()
+            path = self.employee.picture.path
+            os.utime(path, (0, 0))
+
+            temp.seek(0)
+            self.super_client.patch(url, {'picture': temp},
+                                    format='multipart')
+
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_upload_picture_validated_from_header(self):
+        """Test a streamed picture isn't fully decoded for validation"""
+        with mock.patch('django.forms.ImageField.to_python') as to_python:
+            res = self.upload_picture()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        to_python.assert_not_called()
+
+    @override_settings(PICTURE_UPLOAD={'MAX_BYTES': 1000})
+    def test_upload_picture_too_large(self):
+        """Test uploading a picture over the size limit"""
+        res = self.upload_picture(size=(200, 200))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('no larger than 1000 bytes', res.data['picture'][0])
+
+    @override_settings(PICTURE_UPLOAD={'MAX_DIMENSION': 50})
+    def test_upload_picture_too_many_pixels(self):
+        """Test uploading a picture over the dimension limit"""
+        res = self.upload_picture(size=(100, 20))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('picture', res.data)
+
+    def test_upload_picture_unsupported_format(self):
+        """Test uploading a picture in a format that isn't allowed"""
+        res = self.upload_picture(image_format='BMP')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Unsupported image format', res.data['picture'][0])
+
+    def test_upload_picture_not_an_image(self):
+        """Test uploading a file that isn't an image"""
+        url = detail_url(self.employee.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as temp:
+            temp.write(b'not an image' * 1000)
+            temp.seek(0)
+            res = self.super_client.patch(
+                url, {'picture': temp}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('picture', res.data)
+
     def test_upload_picture_bad_request(self):
         """Test uploading an invalid picture"""
         url = detail_url(self.employee.id)
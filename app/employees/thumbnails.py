@@ -0,0 +1,158 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from PIL import Image, ImageOps, features
+
+from core.cache import LRUCache
+from core.db.fanout import run_isolated
+from core.events import publish_change
+from .models import Employee
+from .utils import gen_thumbnail_file_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SIZES': {'small': (64, 64), 'medium': (256, 256)},
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'WORKERS': 2,
+    'SYNC': False,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+# pictures whose thumbnails were all found, never to change again
+_generated = LRUCache(max_size=10000, timeout=None)
+
+
+def get_setting(name):
+    """Return a thumbnail setting from `THUMBNAILS` or its default"""
+    return getattr(settings, 'THUMBNAILS', {}).get(name, DEFAULTS[name])
+
+
+def get_format():
+    """Return the Pillow format and file extension of thumbnails"""
+    image_format = get_setting('FORMAT').upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        image_format = 'JPEG'
+    return image_format, 'jpg' if image_format == 'JPEG' else 'webp'
+
+
+def thumbnail_names(name):
+    """Return thumbnail file names of a picture, keyed by size name"""
+    ext = get_format()[1]
+    return {size: gen_thumbnail_file_path(name, size, ext)
+            for size in get_setting('SIZES')}
+
+
+def generated_thumbnail_names(name):
+    """Return thumbnail_names() once all of them exist, else `{}`
+
+    Media is served as immutable, so a thumbnail URL must not be listed
+    before its file is written.
+    """
+    names = thumbnail_names(name)
+    if _generated.get(name):
+        return names
+    if all(default_storage.exists(path) for path in names.values()):
+        _generated.set(name, True)
+        return names
+    return {}
+
+
+def generate_thumbnails(name):
+    """Write the missing thumbnails of the picture stored under name
+
+    Pictures are content addressed, so existing thumbnails are current.
+    Return whether any thumbnail was written.
+    """
+    missing = {size: path for size, path in thumbnail_names(name).items()
+               if not default_storage.exists(path)}
+    if not missing:
+        return False
+
+    image_format, _ = get_format()
+    with default_storage.open(name) as picture:
+        image = Image.open(picture)
+        image.load()
+    # rotate photos by their EXIF orientation, which thumbnails don't keep
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA') or image_format == 'JPEG':
+        image = image.convert('RGB')
+
+    sizes = get_setting('SIZES')
+    for size, path in missing.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(sizes[size])
+        content = io.BytesIO()
+        thumbnail.save(content, format=image_format,
+                       quality=get_setting('QUALITY'))
+        default_storage.save(path, ContentFile(content.getvalue()))
+    return True
+
+
+def touch_employees(name):
+    """Version and publish the employees pictured by name
+
+    Their thumbnails are listed from now on, see generated_thumbnail_names().
+    """
+    pks = list(Employee.objects.filter(picture=name)
+               .values_list('pk', flat=True))
+    if pks:
+        Employee.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+        publish_change('employees', 'employee.updated', pks)
+
+
+def _run(name):
+    """Generate thumbnails, logging instead of raising errors
+
+    Return whether any thumbnail was written.
+    """
+    try:
+        return generate_thumbnails(name)
+    except Exception:
+        logger.exception('Failed to generate thumbnails for %s', name)
+        return False
+
+
+def _run_in_background(name):
+    """Generate thumbnails on a worker, then touch the employees"""
+    if _run(name):
+        try:
+            run_isolated(touch_employees, name)
+        except Exception:
+            logger.exception('Failed to touch employees pictured by %s',
+                             name)
+
+
+def get_executor():
+    """Return the process wide thumbnail worker pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_setting('WORKERS'),
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def enqueue_thumbnails(name):
+    """Generate thumbnails in the background once the transaction commits
+
+    With `THUMBNAILS['SYNC']` set, they are generated immediately instead.
+    Employees get a new version once their thumbnails are listed.
+    """
+    if get_setting('SYNC'):
+        _run(name)
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run_in_background, name))
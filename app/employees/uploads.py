@@ -0,0 +1,113 @@
+import io
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from PIL import Image
+
+DEFAULTS = {
+    'FIELDS': ('picture',),
+    'MAX_BYTES': 5 * 2 ** 20,
+    'MAX_DIMENSION': 6000,
+    'MAX_PIXELS': 24_000_000,
+    'HEADER_BYTES': 64 * 2 ** 10,
+    'FORMATS': ('JPEG', 'PNG', 'WEBP', 'GIF'),
+}
+
+
+class PictureUploadHandler(TemporaryFileUploadHandler):
+    """Upload handler streaming pictures to disk with early validation
+
+    Files of `PICTURE_UPLOAD['FIELDS']` are checked while they stream in:
+    the format and dimensions are read from the image header as soon as
+    it has arrived, and the byte count is checked on every chunk. A
+    rejected file stops being written and carries `upload_error`, which
+    `PictureField` reports. Accepted files carry `image_format` and
+    `image_size`, so they need not be decoded again.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limits = {**DEFAULTS, **getattr(settings, 'PICTURE_UPLOAD', {})}
+
+    def new_file(self, field_name, *args, **kwargs):
+        """Create the temporary file and reset the checks"""
+        super().new_file(field_name, *args, **kwargs)
+        self.limited = field_name in self.limits['FIELDS']
+        self.checked = False
+        self.header = b''
+        self.received = 0
+        self.error = None
+        if self.limited and self.content_length and \
+                self.content_length > self.limits['MAX_BYTES']:
+            self.reject_size()
+
+    def receive_data_chunk(self, raw_data, start):
+        """Check and write a chunk, dropping it once the file is rejected"""
+        if self.error:
+            return None
+
+        if self.limited:
+            self.received += len(raw_data)
+            if self.received > self.limits['MAX_BYTES']:
+                self.reject_size()
+                return None
+            if not self.checked:
+                missing = self.limits['HEADER_BYTES'] - len(self.header)
+                self.header += raw_data[:missing]
+                self.check_header(final=False)
+                if self.error:
+                    return None
+
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        """Finish the checks and return the file"""
+        if self.limited and not self.error and not self.checked:
+            self.check_header(final=True)
+        file = super().file_complete(file_size)
+        file.upload_error = self.error
+        return file
+
+    def check_header(self, final):
+        """Validate the image format and dimensions from its header"""
+        try:
+            with Image.open(io.BytesIO(self.header)) as image:
+                image_format, image_size = image.format, image.size
+        except Image.DecompressionBombError:
+            self.reject_dimensions()
+            return
+        except Exception:
+            # the header may not have fully arrived yet
+            if final or len(self.header) >= self.limits['HEADER_BYTES']:
+                self.reject('Upload a valid image. The file you uploaded '
+                            'was either not an image or a corrupted image.')
+            return
+
+        self.checked = True
+        width, height = image_size
+        if image_format not in self.limits['FORMATS']:
+            self.reject(f'Unsupported image format {image_format}.')
+        elif max(image_size) > self.limits['MAX_DIMENSION'] or \
+                width * height > self.limits['MAX_PIXELS']:
+            self.reject_dimensions()
+        else:
+            self.file.image_format = image_format
+            self.file.image_size = image_size
+
+    def reject_size(self):
+        """Reject a file that is too large"""
+        self.reject(f'Ensure this file is no larger than '
+                    f'{self.limits["MAX_BYTES"]} bytes.')
+
+    def reject_dimensions(self):
+        """Reject an image with too many pixels"""
+        self.reject(f'Ensure this image is no larger than '
+                    f'{self.limits["MAX_DIMENSION"]} pixels per side and '
+                    f'{self.limits["MAX_PIXELS"]} pixels in total.')
+
+    def reject(self, message):
+        """Stop writing the file and free what was written"""
+        self.error = message
+        self.file.seek(0)
+        self.file.truncate()
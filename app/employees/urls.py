@@ -7,6 +7,12 @@ app_name = 'employees'
 urlpatterns = [
     path('', views.EmployeeListCreateAPIView.as_view(),
          name='employee-list'),
+    path('changes', views.EmployeeChangesAPIView.as_view(),
+         name='employee-changes'),
+    path('export', views.EmployeeExportAPIView.as_view(),
+         name='employee-export'),
+    path('bulk', views.EmployeeBulkAPIView.as_view(),
+         name='employee-bulk'),
     path('<pk>', views.EmployeeDetailsAPIView.as_view(),
          name='employee-details'),
 ]
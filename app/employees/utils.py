@@ -1,9 +1,33 @@
-import uuid
+import hashlib
 import os
 
 
+def file_digest(file):
+    """Return the SHA-256 hex digest of a Django File, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
 def gen_pic_file_path(instance, filename):
-    """Generate file path for employees pictures"""
-    ext = filename.split('.')[-1]
-    filename = f'{uuid.uuid4()}.{ext}'
-    return os.path.join('pictures/', filename)
+    """Generate file path for employees pictures
+
+    The storage replaces the file name with a hash of the content.
+    """
+    ext = filename.split('.')[-1].lower()
+    return os.path.join('pictures/', f'picture.{ext}')
+
+
+def gen_content_file_path(name, digest):
+    """Generate content addressed file path from a name and a digest"""
+    directory = os.path.dirname(name)
+    ext = os.path.splitext(name)[1]
+    return os.path.join(directory, digest[:2], f'{digest}{ext}')
+
+
+def gen_thumbnail_file_path(name, size, ext):
+    """Generate file path for a picture thumbnail of a named size"""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return os.path.join('pictures/thumbnails/', f'{stem}_{size}.{ext}')
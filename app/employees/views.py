@@ -1,19 +1,62 @@
-from rest_framework.generics import ListCreateAPIView, \
+from itertools import islice
+from operator import attrgetter, itemgetter
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.generics import GenericAPIView, ListCreateAPIView, \
     RetrieveUpdateDestroyAPIView
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAdminUser
 
+from core.authentication import CachedTokenAuthentication
+from core.changes import ChangeFeedAPIView
+from core.mixins import AsyncListMixin, AsyncRetrieveMixin, \
+    ConditionalGetMixin, SparseFieldsMixin, ValuesListMixin
+from core.renderers import NDJSONRenderer, CSVRenderer
+from departments.models import batch_counts
+
+from .filters import EmployeeFilterBackend
 from .models import Employee
-from .serializers import EmployeeSerializer, EmployeeDetailsSerializer
+from .serializers import EmployeeSerializer, EmployeeDetailsSerializer, \
+    EmployeeBulkSerializer
+
+
+class EmployeeVersionMixin:
+    """Mixin versioning employees by their department only when expanded
 
+    Department renames are copied to `department_name` and bump the
+    employees' `updated_at`, so other reads need no join.
+    """
 
-class EmployeeListCreateAPIView(ListCreateAPIView):
+    @property
+    def last_modified_fields(self):
+        if self.request.method == 'GET' and self.get_query_list('expand'):
+            return ('updated_at', 'department__updated_at')
+        return ('updated_at',)
+
+
+class EmployeeListCreateAPIView(EmployeeVersionMixin, ConditionalGetMixin,
+                                ValuesListMixin, AsyncListMixin,
+                                ListCreateAPIView):
     """API view to retrieve list of employees or create new"""
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAdminUser,)
+    throttle_scope = 'employees'
     serializer_class = EmployeeSerializer
     queryset = Employee.objects.all()
+    filter_backends = (EmployeeFilterBackend, SearchFilter, OrderingFilter)
+    search_fields = ('^first_name', '^last_name', '^email')
+    # non-null fields only, a null can't be compared to a cursor position
+    ordering_fields = ('created_at', 'salary', 'first_name', 'last_name')
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -23,11 +66,14 @@ class EmployeeListCreateAPIView(ListCreateAPIView):
         return EmployeeSerializer
 
 
-class EmployeeDetailsAPIView(RetrieveUpdateDestroyAPIView):
+class EmployeeDetailsAPIView(EmployeeVersionMixin, ConditionalGetMixin,
+                             SparseFieldsMixin, AsyncRetrieveMixin,
+                             RetrieveUpdateDestroyAPIView):
     """API view to retrieve, update or delete employee"""
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAdminUser,)
+    throttle_scope = 'employees'
     serializer_class = EmployeeSerializer
     queryset = Employee.objects.all()
 
@@ -37,3 +83,170 @@ class EmployeeDetailsAPIView(RetrieveUpdateDestroyAPIView):
             return EmployeeDetailsSerializer
 
         return EmployeeSerializer
+
+
+class EmployeeChangesAPIView(ChangeFeedAPIView):
+    """API view to list employees changed or deleted since a cursor"""
+
+    serializer_class = EmployeeDetailsSerializer
+    queryset = Employee.objects.all()
+    throttle_scope = 'employees'
+
+
+class EmployeeExportAPIView(APIView):
+    """API view to stream all employees as NDJSON or CSV"""
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    throttle_scope = 'employees'
+    renderer_classes = (NDJSONRenderer, CSVRenderer)
+    chunk_size = 2000
+
+    def get(self, request):
+        """Stream employees, reading them from the database in chunks"""
+        serializer = EmployeeDetailsSerializer(context={'request': request})
+        fields = [name for name, field in serializer.fields.items()
+                  if not field.write_only]
+        queryset = Employee.objects.all()
+        values = serializer.get_values_representation()
+        if values is None:
+            rows = map(serializer.to_representation,
+                       self.iter_pages(queryset, attrgetter('pk')))
+        else:
+            lookups, represent = values
+            rows = map(represent, self.iter_pages(queryset.values(*lookups),
+                                                  itemgetter('id')))
+
+        renderer = request.accepted_renderer
+        content = renderer.iter_render(rows, fields)
+        if isinstance(request._request, ASGIRequest):
+            # ASGI would otherwise read a sync iterator to the end first
+            content = self.aiter_chunks(content)
+        response = StreamingHttpResponse(
+            content,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="employees.{renderer.format}"'
+        return response
+
+    def iter_pages(self, queryset, get_id):
+        """Yield the rows of queryset by id, querying chunk_size at a time
+
+        Each page starts after the last id of the previous one, as
+        `iterator()` reads the whole result at once with mysqlclient.
+        """
+        page = queryset.order_by('id')
+        while True:
+            rows = list(page[:self.chunk_size])
+            yield from rows
+            if len(rows) < self.chunk_size:
+                return
+            page = queryset.filter(id__gt=get_id(rows[-1])).order_by('id')
+
+    async def aiter_chunks(self, content):
+        """Yield the encoded lines of content joined in chunks
+
+        Each chunk is read in the request's thread, which holds the
+        connection of the query, so only a chunk is ever in memory.
+        """
+        read = sync_to_async(
+            lambda: b''.join(islice(content, self.chunk_size)))
+        try:
+            while chunk := await read():
+                yield chunk
+        finally:
+            await sync_to_async(content.close)()
+
+
+class EmployeeBulkAPIView(GenericAPIView):
+    """API view to create, update or delete employees in bulk"""
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    throttle_scope = 'employees'
+    serializer_class = EmployeeBulkSerializer
+    queryset = Employee.objects.all()
+    max_batch_size = 5000
+
+    def get_serializer(self, *args, **kwargs):
+        """Return a list serializer for the batch"""
+        kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+
+    def post(self, request):
+        """Create a list of employees"""
+        self.check_batch(request.data)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        """Partially update a list of employees identified by their id"""
+        self.check_batch(request.data)
+        ids = [item.get('id') if isinstance(item, dict) else None
+               for item in request.data]
+        instances = self.get_instances(ids)
+        serializer = self.get_serializer(instances, data=request.data,
+                                         partial=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+
+        return Response(serializer.data)
+
+    def delete(self, request):
+        """Delete a list of employees given as a list of ids"""
+        self.check_batch(request.data)
+        instances = self.get_instances(request.data)
+        with transaction.atomic(), batch_counts():
+            self.get_queryset().filter(
+                pk__in=[instance.pk for instance in instances]
+            ).delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def check_batch(self, data):
+        """Raise a validation error unless data is a list of a valid size"""
+        if not isinstance(data, list) or not data:
+            message = 'Expected a non empty list of items.'
+        elif len(data) > self.max_batch_size:
+            message = f'Ensure this list has no more than ' \
+                      f'{self.max_batch_size} items.'
+        else:
+            return
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+    def get_instances(self, ids):
+        """Return employees for ids in order, with per-item errors"""
+        pks = []
+        for pk in ids:
+            try:
+                pks.append(int(pk) if not isinstance(pk, bool) else None)
+            except (TypeError, ValueError):
+                pks.append(None)
+
+        instances = self.get_queryset().in_bulk(
+            [pk for pk in pks if pk is not None]
+        )
+
+        errors = []
+        seen = set()
+        for pk in pks:
+            if pk is None:
+                errors.append({'id': ['A valid integer is required.']})
+            elif pk in seen:
+                errors.append({'id': ['Duplicated in this request.']})
+            elif pk not in instances:
+                errors.append({'id': ['Not found.']})
+            else:
+                errors.append({})
+            seen.add(pk)
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        return [instances[pk] for pk in pks]
@@ -0,0 +1,30 @@
+"""
+Gunicorn config for project project.
+
+Runs the ASGI application on uvicorn workers by default, or the WSGI one
+with WEB_WORKER_CLASS=sync or gthread. The application is loaded before
+forking so workers share its memory.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('WEB_WORKER_CLASS',
+                              'uvicorn.workers.UvicornWorker')
+threads = int(os.environ.get('WEB_THREADS', 1))
+wsgi_app = ('project.asgi:application' if 'uvicorn' in worker_class
+            else 'project.wsgi:application')
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = timeout
+keepalive = 5
+# recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+forwarded_allow_ips = '*'
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,17 +81,54 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# DB_POOL_SIZE > 0 takes connections from a process wide pool, otherwise
+# connections persist per thread for DB_CONN_MAX_AGE seconds
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'core.db.backends.mysql',
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else
+        int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': DB_POOL_SIZE and {
+                'max_size': DB_POOL_SIZE,
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'max_lifetime': int(os.environ.get('DB_POOL_MAX_LIFETIME',
+                                                   3600)),
+            },
+        },
     }
 }
 
+# Run independent queries of async views concurrently, each in a worker
+# thread on its own connection; best with a pool bounding the connections
+ASYNC_QUERY_FANOUT = os.environ.get(
+    'ASYNC_QUERY_FANOUT', '1' if DB_POOL_SIZE else '0') == '1'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# shared by every worker through Redis when REDIS_URL is set, otherwise
+# local to each process
+REDIS_URL = os.environ.get('REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -136,6 +174,90 @@ STATIC_ROOT = '/data/web/static'
 
 LOGIN_URL = '/admin'
 
+FILE_UPLOAD_HANDLERS = ['employees.uploads.PictureUploadHandler']
+# keep on the MEDIA_ROOT filesystem so uploads are moved, not copied
+FILE_UPLOAD_TEMP_DIR = os.environ.get('FILE_UPLOAD_TEMP_DIR')
+
+PICTURE_UPLOAD = {
+    'MAX_BYTES': int(os.environ.get('PICTURE_MAX_BYTES', 5 * 2 ** 20)),
+    'MAX_DIMENSION': 6000,
+    'MAX_PIXELS': 24_000_000,
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 100)),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.TokenBucketThrottle',
+    ),
+    # per worker with LocalBucketBackend, so N workers allow N times the
+    # rate, more after each worker recycle; production shares the buckets
+    # through the cache with CacheBucketBackend
+    'DEFAULT_THROTTLE_RATES': {
+        'employees': os.environ.get('THROTTLE_RATE_EMPLOYEES', '1200/min'),
+        'departments': os.environ.get('THROTTLE_RATE_DEPARTMENTS',
+                                      '1200/min'),
+        'token': os.environ.get('THROTTLE_RATE_TOKEN', '20/min'),
+    },
+    # anonymous clients are told apart by the address nginx appends to
+    # X-Forwarded-For, which the client can't spoof
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 1)),
+}
+
+THROTTLE = {
+    'BACKEND': os.environ.get('THROTTLE_BACKEND',
+                              'core.throttling.LocalBucketBackend'),
+    'MAX_SIZE': 10000,
+    'DJANGO_CACHE': 'default',
+}
+
+TOKEN_AUTH_CACHE = {
+    'TIMEOUT': int(os.environ.get('TOKEN_AUTH_CACHE_TIMEOUT', 60)),
+    'LOCAL_TIMEOUT': 5,
+    'MAX_SIZE': 10000,
+    'DJANGO_CACHE': os.environ.get('TOKEN_AUTH_DJANGO_CACHE'),
+}
+
+RESPONSE_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
+THUMBNAILS = {
+    'SIZES': {'small': (64, 64), 'medium': (256, 256)},
+    'FORMAT': 'WEBP',
+    'WORKERS': int(os.environ.get('THUMBNAIL_WORKERS', 2)),
+    'SYNC': False,
+}
+
+# LAG holds back changes for longer than any write transaction lasts, bulk
+# requests are bounded by WEB_TIMEOUT; tombstones older than RETENTION_DAYS
+# are pruned by prune_tombstones
+CHANGE_FEED = {
+    'LAG': int(os.environ.get('CHANGE_FEED_LAG', 60)),
+    'RETENTION_DAYS': int(os.environ.get('CHANGE_FEED_RETENTION_DAYS', 30)),
+}
+
+# opt-in per request timing and query counts, exposed at /metrics; each
+# worker adds its totals to the shared cache every FLUSH_INTERVAL seconds
+REQUEST_METRICS = {
+    'ENABLED': os.environ.get('REQUEST_METRICS', '') == '1',
+    'FLUSH_INTERVAL': int(os.environ.get('REQUEST_METRICS_FLUSH_INTERVAL',
+                                         10)),
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': int(os.environ.get('SLOW_REQUEST_MS', 500)),
+    'SLOW_REQUEST_QUERIES': int(os.environ.get('SLOW_REQUEST_QUERIES', 50)),
+}
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Token': {
@@ -0,0 +1,87 @@
+"""
+Production settings for project project.
+
+Everything in settings.py, with DEBUG off and secrets and hosts taken from
+the environment. Static and media files are served by the reverse proxy
+from STATIC_ROOT and MEDIA_ROOT.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, REDIS_URL, REST_FRAMEWORK, THROTTLE, \
+    TOKEN_AUTH_CACHE
+
+DEBUG = False
+
+SECRET_KEY = os.environ['SECRET_KEY']
+
+# caches, throttles and events must be shared by the gunicorn workers
+if not REDIS_URL and int(os.environ.get('WEB_CONCURRENCY', 2)) > 1:
+    raise ImproperlyConfigured(
+        'REDIS_URL is required when running more than one worker'
+    )
+
+# ASGI runs each request's sync code in a thread of its own, whose
+# persistent connections would be left open; see gunicorn.conf.py
+if 'uvicorn' in os.environ.get('WEB_WORKER_CLASS',
+                               'uvicorn.workers.UvicornWorker'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost').split(',')
+
+# the proxy terminates TLS and passes the original scheme
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# set when served over HTTPS only
+SESSION_COOKIE_SECURE = CSRF_COOKIE_SECURE = \
+    os.environ.get('SECURE_COOKIES', '') == '1'
+
+# content hashed file names, so the proxy can cache static files forever
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.'
+                   'ManifestStaticFilesStorage',
+    },
+}
+
+# token lookups are shared, and invalidated, through the Redis cache
+TOKEN_AUTH_CACHE = {
+    **TOKEN_AUTH_CACHE,
+    'DJANGO_CACHE': os.environ.get('TOKEN_AUTH_DJANGO_CACHE', 'default'),
+}
+
+# rates are enforced across workers through the Redis cache
+THROTTLE = {
+    **THROTTLE,
+    'BACKEND': os.environ.get('THROTTLE_BACKEND',
+                              'core.throttling.CacheBucketBackend'),
+}
+
+# events reach the subscribers of every worker through the Redis cache
+EVENTS = {
+    'BACKEND': 'core.events.CacheBackend',
+}
+
+# the browsable API is for development only
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ('core.renderers.FastJSONRenderer',),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.environ.get('LOG_LEVEL', 'INFO'),
+    },
+}
@@ -15,8 +15,6 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
-from django.conf import settings
 
 urlpatterns = [
     path('', include('core.urls')),
@@ -24,4 +22,4 @@ urlpatterns = [
     path('api/users/', include('users.urls')),
     path('api/departments/', include('departments.urls')),
     path('api/employees/', include('employees.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
@@ -5,6 +5,8 @@ while ! nc -z db 3306 ; do
     sleep 3
 done
 
-python manage.py makemigrations
-python manage.py migrate
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+export DJANGO_SETTINGS_MODULE=${DJANGO_SETTINGS_MODULE:-project.settings_production}
+
+python manage.py migrate --noinput
+python manage.py collectstatic --noinput
+exec gunicorn -c project/gunicorn.conf.py
@@ -1,8 +1,10 @@
-from rest_framework import authentication, permissions
+from rest_framework import permissions
 from rest_framework.generics import RetrieveUpdateAPIView
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+
 from .serializers import UserSerializer
 
 
@@ -14,12 +16,15 @@ from .serializers import UserSerializer
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user"""
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # ObtainAuthToken disables throttling
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'token'
 
 
 class UserDetailsAPIView(RetrieveUpdateAPIView):
     """API view to retrieve, update authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):